@@ -2,25 +2,26 @@
 
 from fastapi import FastAPI, Request, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, Field
 from typing import Optional, List
 from pathlib import Path
-import threading
+import asyncio, json, time, uuid
 import plotly.graph_objects as go
 
-from backend.ctrader_client import (
-    init_client, get_open_positions, get_pending_orders,
-    get_ohlc_data, place_order, wait_for_deferred,
-    symbol_name_to_id, symbol_digits_map, client, ACCOUNT_ID, symbol_map
-)
+from backend import broker
 
 from backend.data_fetcher import fetch_data
 from backend.symbol_fetcher import get_available_symbols
 from backend.indicators import add_indicators
 from backend.llm_analyzer import analyze_chart_with_llm
 from backend.smc_features import detect_bos_choch, current_fvg, ob_near_price, in_premium_discount
+from backend.metrics import (
+    HTTP_IN_FLIGHT, HTTP_SECONDS, render_metrics, server_timing_header, stage, start_request_timings,
+    start_snapshot_writer,
+)
 
 
  
@@ -36,9 +37,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def track_requests(request: Request, call_next):
+    timings = start_request_timings()
+    HTTP_IN_FLIGHT.inc()
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        if timings:
+            response.headers["Server-Timing"] = server_timing_header(timings)
+        return response
+    finally:
+        HTTP_IN_FLIGHT.dec()
+        route = request.scope.get("route")
+        HTTP_SECONDS.observe(
+            time.perf_counter() - t0,
+            method=request.method, route=getattr(route, "path", "unmatched"), status=status,
+        )
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/api/health")
 def health():
-    return {"status": "ok", "connected": client.connected}
+    try:
+        connected = broker.is_connected()
+    except RuntimeError:   # broker gateway down
+        connected = False
+    return {"status": "ok", "connected": connected}
 
 @app.get("/", response_class=HTMLResponse)
 async def home():
@@ -61,7 +90,8 @@ async def get_candles(
 
     indicator_data = {}
     if indicators:
-        df = add_indicators(df, indicators)
+        with stage("indicators"):
+            df = add_indicators(df, indicators)
         for ind in indicators:
             key = ind.replace(" ", "_").replace("(", "_").replace(")", "").replace("-", "_")
             if key in df.columns:
@@ -70,31 +100,20 @@ async def get_candles(
                     for ts, val in df[key].dropna().items()
                 ]
 
-    candles = [ {
-        "time": int(idx.timestamp()),
-        "open": row["open"],
-        "high": row["high"],
-        "low" : row["low"],
-        "close": row["close"]
-    } for idx, row in df.iterrows()]
+    with stage("serialize"):
+        candles = [ {
+            "time": int(idx.timestamp()),
+            "open": row["open"],
+            "high": row["high"],
+            "low" : row["low"],
+            "close": row["close"]
+        } for idx, row in df.iterrows()]
 
     return {"candles": candles, "indicators": indicator_data}
 
-@app.post("/api/analyze")
-async def analyze(req: Request):
-    body = await req.json()
-    symbol = body.get("symbol")
-    timeframe = body.get("timeframe", "M5")
-    indicators = body.get("indicators", [])
-
-    df, _ = fetch_data(symbol, timeframe)
-    if df.empty:
-        return {"analysis": "No data available."}
-
-    if indicators:
-        df = add_indicators(df, indicators)
-
-    # === 🔍 Enhanced Plotly Chart with SMC Annotations ===
+# === 🔍 Enhanced Plotly Chart with SMC Annotations ===
+def build_analysis_figure(df):
+    """Candlestick chart annotated with the SMC features sent to the LLM."""
     fig = go.Figure()
     fig.add_trace(go.Candlestick(
         x=df.index, open=df["open"], high=df["high"],
@@ -145,6 +164,26 @@ async def analyze(req: Request):
             showarrow=False, font=dict(size=11, color="gray"), yshift=-40
         )
 
+    return fig
+
+@app.post("/api/analyze")
+async def analyze(req: Request):
+    body = await req.json()
+    symbol = body.get("symbol")
+    timeframe = body.get("timeframe", "M5")
+    indicators = body.get("indicators", [])
+
+    df, _ = fetch_data(symbol, timeframe)
+    if df.empty:
+        return {"analysis": "No data available."}
+
+    if indicators:
+        with stage("indicators"):
+            df = add_indicators(df, indicators)
+
+    with stage("chart_build"):
+        fig = build_analysis_figure(df)
+
     # === 🔮 LLM SMC Decision ===
     td = await analyze_chart_with_llm(fig=fig, df=df, symbol=symbol, timeframe=timeframe, indicators=indicators)
     return {"analysis": td.dict()}
@@ -158,95 +197,110 @@ class PlaceOrderRequest(BaseModel):
     stop_loss: Optional[float] = None
     take_profit: Optional[float] = None
 
-@app.post("/api/execute_trade")
-def execute_trade(order: PlaceOrderRequest):
+class OrderIntent(PlaceOrderRequest):
+    client_msg_id: Optional[str] = Field(None, max_length=64)
+
+class OrderBatch(BaseModel):
+    intents: List[OrderIntent] = Field(..., min_length=1, max_length=100)
+
+ORDER_WAIT_MARGIN = 5     # seconds past the intents' own deadline, so their final state is seen
+ORDER_POLL_SECONDS = 0.2
+REJECTION_STATUS = {"SYMBOLS_NOT_LOADED": 503, "UNKNOWN_SYMBOL": 404, "INVALID_INTENT": 422, "INVALID_VOLUME": 422}
+
+def _intent_dict(intent: OrderIntent) -> dict:
+    data = intent.model_dump(exclude_none=True) if hasattr(intent, "model_dump") else intent.dict(exclude_none=True)
+    # fix the idempotency key here so a client retry of the same intent is deduplicated.
+    # The gateway remembers ids in memory only, so that holds while the same gateway
+    # process is alive; for that reason GatewayClient never resends submit_intents itself.
+    data.setdefault("client_msg_id", uuid.uuid4().hex)
+    return data
+
+async def _broker_call(fn, *args):
+    """Run a blocking broker call off the event loop; broker/gateway outages become 503."""
     try:
-        if not symbol_name_to_id:
-            raise HTTPException(503, "Symbols not loaded yet.")
-
-        symbol_key = order.symbol.upper()
-        if symbol_key not in symbol_name_to_id:
-            raise HTTPException(404, f"Symbol '{order.symbol}' not found.")
-
-        symbol_id = symbol_name_to_id[symbol_key]
-        print(f"[ORDER DEBUG] Sending order: {order=}, {symbol_id=}")
-
-        volume_raw = order.volume * 10_000_000
-
-        deferred = place_order(
-            client=client,
-            account_id=ACCOUNT_ID,
-            symbol_id=symbol_id,
-            order_type=order.order_type,
-            side=order.direction,
-            volume=volume_raw,
-            price=order.entry_price,
-            stop_loss=None if order.order_type == "MARKET" else order.stop_loss,
-            take_profit=None if order.order_type == "MARKET" else order.take_profit
-        )
+        return await run_in_threadpool(fn, *args)
+    except TimeoutError as e:
+        raise HTTPException(504, str(e))
+    except RuntimeError as e:
+        raise HTTPException(503, str(e))
+
+async def _submit(intents):
+    return await _broker_call(broker.submit_intents, [_intent_dict(i) for i in intents])
+
+async def _order_updates(acks):
+    """Yield each record whenever its status changes, until all are final or past their deadline."""
+    last = {a["client_msg_id"]: a for a in acks}
+    pending = [c for c, a in last.items() if not a["done"]]
+    # the gateway forces every sent intent final by its deadline; wait a little longer than that
+    deadline = max((last[c]["deadline"] or 0 for c in pending), default=0) + ORDER_WAIT_MARGIN
+    while pending and time.time() < deadline:
+        await asyncio.sleep(ORDER_POLL_SECONDS)
+        try:
+            records = await run_in_threadpool(broker.get_order_status, pending)
+        except RuntimeError as e:
+            print(f"[ERROR] Lost order status updates: {e}")
+            return
+        for record in records:
+            cid = record["client_msg_id"]
+            if record["status"] != last[cid]["status"] or record["done"]:
+                last[cid] = record
+                yield record
+        pending = [c for c in pending if not last[c]["done"]]
+
+@app.post("/api/orders")
+async def submit_orders(batch: OrderBatch):
+    """Submit a basket of intents; streams NDJSON: one ack per intent, then status updates."""
+    acks = await _submit(batch.intents)
+
+    async def stream():
+        for ack in acks:
+            yield json.dumps(ack) + "\n"
+        async for record in _order_updates(acks):
+            yield json.dumps(record) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.get("/api/orders/{client_msg_id}")
+async def order_status(client_msg_id: str):
+    record = (await _broker_call(broker.get_order_status, [client_msg_id]))[0]
+    if record["status"] == "unknown":
+        raise HTTPException(404, f"Unknown order intent '{client_msg_id}'.")
+    return record
 
-        result = wait_for_deferred(deferred, timeout=25)
-
-        if order.order_type.upper() == "MARKET" and (order.stop_loss or order.take_profit):
-            print("[INFO] Waiting to amend SL/TP after market execution...")
-            import time
-            from ctrader_client import modify_position_sltp
-
-            for attempt in range(5):
-                time.sleep(2)
-                for p in get_open_positions():
-                    if (
-                        p["symbol_name"].upper() == order.symbol.upper()
-                        and p["direction"].upper() == order.direction.upper()
-                    ):
-                        print("[INFO] Found market position, amending SL/TP.")
-                        amend_result = modify_position_sltp(
-                            client=client,
-                            account_id=ACCOUNT_ID,
-                            position_id=p["position_id"],
-                            stop_loss=order.stop_loss,
-                            take_profit=order.take_profit
-                        )
-                        return {
-                            "status": "success",
-                            "submitted": True,
-                            "details": {"status": "ok", "amended_sl_tp": True, "amend_result": str(amend_result)}
-                        }
-                print(f"[WARN] Position not found yet, retrying ({attempt+1}/5)...")
-
-            return {
-                "status": "success",
-                "submitted": True,
-                "details": {"status": "failed", "error": "Position not found after MARKET execution"}
-            }
-
-        return {
-            "status": "success",
-            "submitted": True,
-            "details": result
-        }
-
-    except HTTPException:
-        raise
-    except Exception as e:
-        print(f"[ERROR] Failed placing order: {e}")
-        raise HTTPException(500, detail=str(e))
+@app.post("/api/execute_trade")
+async def execute_trade(order: OrderIntent):
+    ack = (await _submit([order]))[0]
+    if ack["status"] == "rejected" and ack["error_code"] in REJECTION_STATUS:
+        raise HTTPException(REJECTION_STATUS[ack["error_code"]], ack["error"])
+
+    record = ack
+    async for record in _order_updates([ack]):
+        pass
+    if not record["done"]:
+        # lost contact with the gateway before the intent settled: the order may still fill
+        raise HTTPException(504, detail=f"Order {record['client_msg_id']} is still '{record['status']}'; "
+                                        f"check GET /api/orders/{record['client_msg_id']}.")
+    if record["status"] in ("rejected", "timeout"):
+        print(f"[ERROR] Failed placing order: {record['error']}")
+        raise HTTPException(504 if record["status"] == "timeout" else 500, detail=record["error"])
+    if record.get("sltp_error"):
+        # filled: the position is open, only its SL/TP is missing — never report a failure here
+        print(f"[WARN] {record['symbol']} position {record['position_id']} has no SL/TP: {record['sltp_error']}")
+    return {
+        "status": "success",
+        "submitted": True,
+        "details": record
+    }
 
 @app.get("/api/open_positions")
 async def open_positions():
-    return get_open_positions()
+    return await _broker_call(broker.get_open_positions)
 
 @app.get("/api/pending_orders")
 async def pending_orders():
-    pending = get_pending_orders()
-    return [ {
-        "order_id": o.orderId,
-        "symbol": symbol_map.get(o.tradeData.symbolId),
-        "type": "LIMIT" if o.orderType == 2 else "STOP",
-        "side": "buy" if o.tradeData.tradeSide == 1 else "sell",
-        "price": getattr(o, "limitPrice", getattr(o, "stopPrice", 0)) / 100_000,
-        "volume": o.tradeData.volume / 10_000_000,
-    } for o in pending ]
-
-# 🧠 Run cTrader client in background
-threading.Thread(target=init_client, daemon=True).start()
+    return await _broker_call(broker.get_pending_orders)
+
+# 🧠 Run cTrader client in background (or use the shared broker gateway)
+broker.start()
+# 📊 share this worker's metrics with the others (METRICS_MULTIPROC_DIR)
+start_snapshot_writer()
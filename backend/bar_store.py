@@ -0,0 +1,281 @@
+# bar_store.py
+# ---------------------------------------------------------------------------
+# Shared-memory OHLCV ring buffers, one segment per (symbol, timeframe).
+# The data layer (broker_gateway.BarCache) is the only writer; feature,
+# backtest and scan workers attach by name and read NumPy views of the same
+# pages instead of receiving pickled copies.
+#
+# Segment layout: int64[8] header, then `capacity` records of BAR_DTYPE.
+# Writers bump an even/odd sequence counter around every update (seqlock);
+# `read()` retries until it gets a consistent copy, `view()` is zero-copy
+# and live. The header also carries a creation stamp that the writer
+# clears when it unlinks or replaces a segment, so readers can tell that
+# their mapping is orphaned and re-attach by name.
+
+from multiprocessing import resource_tracker, shared_memory
+import atexit, os, re, threading, time
+import numpy as np
+import pandas as pd
+
+
+BAR_DTYPE = np.dtype([
+    ("time", "<i8"),     # UTC epoch seconds
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("volume", "<f8"),
+])
+
+CAPACITY = int(os.getenv("BAR_STORE_CAPACITY", "0"))   # bars per segment; 0 disables publishing
+PREFIX = os.getenv("BAR_STORE_PREFIX", "smc")
+READ_TIMEOUT = 1.0   # seconds a reader waits for a writer that is mid-update
+
+_MAGIC, _VERSION = 0x534D4342, 2   # "SMCB"
+_HEADER_SLOTS = 8
+_H_MAGIC, _H_VERSION, _H_CAPACITY, _H_COUNT, _H_HEAD, _H_SEQ, _H_UPDATED, _H_GENERATION = range(8)
+_HEADER_BYTES = _HEADER_SLOTS * 8
+_RETIRED = -1
+
+# POSIX shared memory shows up here on Linux; lets readers compare inodes
+_SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+
+def segment_name(symbol: str, tf: str) -> str:
+    return f"{PREFIX}_bars_{re.sub(r'[^A-Za-z0-9]', '_', symbol.upper())}_{tf}"
+
+
+def records_from_bars(bars) -> np.ndarray:
+    """Convert ctrader_client bar dicts (ISO `time`) into a BAR_DTYPE array."""
+    out = np.empty(len(bars), dtype=BAR_DTYPE)
+    if not len(bars):
+        return out
+    times = pd.to_datetime([b["time"] for b in bars], utc=True)
+    out["time"] = (times - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(seconds=1)
+    for field in ("open", "high", "low", "close", "volume"):
+        out[field] = [b[field] for b in bars]
+    return out
+
+
+def to_frame(records: np.ndarray) -> pd.DataFrame:
+    """DataFrame shaped like data_fetcher.fetch_data's (copies the columns)."""
+    df = pd.DataFrame({f: records[f] for f in ("open", "high", "low", "close", "volume")})
+    df.index = pd.to_datetime(records["time"], unit="s", utc=True)
+    df.index.name = "time"
+    return df
+
+
+_attach_lock = threading.Lock()
+
+
+def _segment_inode(name):
+    if _SHM_DIR is None:
+        return None
+    try:
+        return os.stat(os.path.join(_SHM_DIR, name)).st_ino
+    except FileNotFoundError:
+        return -1
+
+
+def _retire(shm):
+    """Mark a segment as replaced so readers still mapped to it re-attach."""
+    if shm.size < _HEADER_BYTES:
+        return
+    header = np.ndarray((_HEADER_SLOTS,), dtype=np.int64, buffer=shm.buf)
+    if header[_H_MAGIC] == _MAGIC:
+        header[_H_GENERATION] = _RETIRED
+    del header
+
+
+def _attach_segment(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)   # Python 3.13+
+    except TypeError:
+        pass
+    # Older Pythons register every attach with the resource tracker (shared with
+    # the writer across fork), which would unlink the writer's segment when a
+    # reader exits. Skip registration instead of unregistering afterwards.
+    with _attach_lock:
+        register = resource_tracker.register
+        resource_tracker.register = lambda *args, **kwargs: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+class BarRing:
+    """One (symbol, timeframe) OHLCV ring buffer in shared memory."""
+
+    def __init__(self, shm, owner=False):
+        self.shm = shm
+        self.owner = owner
+        self._header = np.ndarray((_HEADER_SLOTS,), dtype=np.int64, buffer=shm.buf)
+        if self._header[_H_MAGIC] != _MAGIC or self._header[_H_VERSION] != _VERSION:
+            raise ValueError(f"'{shm.name}' is not a bar store segment")
+        self._data = np.ndarray(
+            (int(self._header[_H_CAPACITY]),), dtype=BAR_DTYPE, buffer=shm.buf, offset=_HEADER_BYTES,
+        )
+        self.generation = int(self._header[_H_GENERATION])
+        self._inode = _segment_inode(shm.name)
+
+    @classmethod
+    def create(cls, symbol, tf, capacity=None):
+        capacity = capacity or CAPACITY
+        if capacity <= 0:
+            raise ValueError("BarRing capacity must be positive")
+        name = segment_name(symbol, tf)
+        size = _HEADER_BYTES + capacity * BAR_DTYPE.itemsize
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # left over from a crashed writer: start afresh
+            stale = shared_memory.SharedMemory(name=name)
+            _retire(stale)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        header = np.ndarray((_HEADER_SLOTS,), dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[_H_MAGIC], header[_H_VERSION], header[_H_CAPACITY] = _MAGIC, _VERSION, capacity
+        header[_H_GENERATION] = time.time_ns()
+        del header
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, symbol, tf):
+        return cls(_attach_segment(segment_name(symbol, tf)))
+
+    # ── state ──────────────────────────────────────────────────────────────
+    @property
+    def capacity(self):
+        return len(self._data)
+
+    def __len__(self):
+        return int(self._header[_H_COUNT])
+
+    @property
+    def updated_ns(self):
+        return int(self._header[_H_UPDATED])
+
+    @property
+    def stale(self):
+        """True once the writer has unlinked or replaced this segment (re-attach by name)."""
+        if int(self._header[_H_GENERATION]) != self.generation:
+            return True
+        return self._inode is not None and _segment_inode(self.shm.name) != self._inode
+
+    # ── writer ─────────────────────────────────────────────────────────────
+    def _begin(self):
+        self._header[_H_SEQ] += 1   # odd: write in progress
+
+    def _commit(self, head, count):
+        self._header[_H_HEAD] = head
+        self._header[_H_COUNT] = count
+        self._header[_H_UPDATED] = time.time_ns()
+        self._header[_H_SEQ] += 1   # even: consistent
+
+    def replace(self, records):
+        """Overwrite the buffer with the newest `capacity` records (full history refresh)."""
+        records = records[-self.capacity:]
+        k = len(records)
+        self._begin()
+        self._data[:k] = records
+        self._commit(k % self.capacity, k)
+
+    def append(self, records):
+        """Append records, overwriting the oldest once the ring is full."""
+        records = records[-self.capacity:]
+        k = len(records)
+        if not k:
+            return
+        head = int(self._header[_H_HEAD])
+        self._begin()
+        first = min(k, self.capacity - head)
+        self._data[head:head + first] = records[:first]
+        self._data[:k - first] = records[first:]
+        self._commit((head + k) % self.capacity, min(self.capacity, len(self) + k))
+
+    # ── readers ────────────────────────────────────────────────────────────
+    def view(self, n=None):
+        """Newest `n` records, oldest first. Zero-copy unless the range wraps; not snapshot-safe."""
+        count = len(self)
+        n = count if n is None else min(n, count)
+        head = int(self._header[_H_HEAD])
+        start = (head - n) % self.capacity
+        if start + n <= self.capacity:
+            return self._data[start:start + n]
+        return np.concatenate((self._data[start:], self._data[:head]))
+
+    def read(self, n=None, timeout=READ_TIMEOUT):
+        """Consistent copy of the newest `n` records (retries while the writer is mid-update).
+
+        Raises TimeoutError if no consistent copy is seen within `timeout` seconds,
+        e.g. when the writer died halfway through an update.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            seq = int(self._header[_H_SEQ])
+            if not seq % 2:
+                out = np.array(self.view(n), copy=True)
+                if int(self._header[_H_SEQ]) == seq:
+                    return out
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"'{self.shm.name}' stayed mid-update for {timeout}s (writer stalled?)")
+            time.sleep(0)
+
+    def close(self):
+        # a newer writer may already have replaced this segment under the same name
+        unlink = self.owner and not self.stale
+        if unlink:
+            self._header[_H_GENERATION] = _RETIRED
+        # drop our views before releasing the mapping
+        self._header = self._data = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+# ── data-layer writer / reader helpers ─────────────────────────────────────
+_writers = {}   # {(SYMBOL, tf): BarRing}
+_readers = {}
+
+
+def publish(symbol, tf, bars):
+    """Write a freshly fetched history into the shared store (no-op unless BAR_STORE_CAPACITY > 0)."""
+    if CAPACITY <= 0 or not bars:
+        return
+    key = (symbol.upper(), tf)
+    ring = _writers.get(key)
+    if ring is None:
+        ring = _writers[key] = BarRing.create(symbol, tf)
+    ring.replace(records_from_bars(bars))
+
+
+def load_records(symbol, tf, n=None, copy=True):
+    """Bars from another process's store; copy=False returns the live zero-copy view."""
+    key = (symbol.upper(), tf)
+    ring = _readers.get(key)
+    if ring is not None and ring.stale:
+        # the writer restarted: drop the orphaned mapping
+        _readers.pop(key).close()
+        ring = None
+    if ring is None:
+        ring = _readers[key] = BarRing.attach(symbol, tf)
+    return ring.read(n) if copy else ring.view(n)
+
+
+def load_frame(symbol, tf, n=None):
+    return to_frame(load_records(symbol, tf, n))
+
+
+@atexit.register
+def _close_all():
+    for ring in list(_readers.values()) + list(_writers.values()):
+        try:
+            ring.close()
+        except Exception:
+            pass
+    _readers.clear()
+    _writers.clear()
@@ -0,0 +1,53 @@
+# broker.py
+# ---------------------------------------------------------------------------
+# Broker access for the API layer. By default the cTrader connection runs in
+# this process (single uvicorn worker). With BROKER_GATEWAY_SOCKET set, every
+# call goes to the one broker_gateway.py process instead, so the HTTP tier
+# can run several workers without opening one broker session each.
+
+import os, threading
+
+GATEWAY_SOCKET = os.getenv("BROKER_GATEWAY_SOCKET")
+
+if GATEWAY_SOCKET:
+    from backend.broker_ipc import GatewayClient
+    _call = GatewayClient(GATEWAY_SOCKET).call
+else:
+    from backend.broker_gateway import local_call as _call
+
+
+def start():
+    """Connect to cTrader in the background (no-op when a gateway owns the connection)."""
+    if GATEWAY_SOCKET:
+        return
+    from backend.ctrader_client import init_client
+    threading.Thread(target=init_client, daemon=True).start()
+
+
+def is_connected():
+    return _call("health")["connected"]
+
+
+def get_symbols():
+    return _call("symbols")
+
+
+def get_ohlc_data(symbol: str, tf: str = "D1", n: int = 10):
+    return _call("ohlc", symbol=symbol, tf=tf, n=n)
+
+
+def get_open_positions():
+    return _call("open_positions")
+
+
+def get_pending_orders():
+    return _call("pending_orders")
+
+
+def submit_intents(intents):
+    """Queue a batch of order intents; returns one acknowledgement per intent."""
+    return _call("submit_intents", intents=intents)
+
+
+def get_order_status(client_msg_ids):
+    return _call("order_status", client_msg_ids=client_msg_ids)
@@ -0,0 +1,137 @@
+# broker_gateway.py
+# ---------------------------------------------------------------------------
+# Single process owning the cTrader connection (reactor, symbol maps, bar
+# cache, shared-memory bar store writer). API workers reach it over a Unix socket via broker.py, so uvicorn
+# can run several workers against one broker session.
+#
+#   python -m backend.broker_gateway --socket /tmp/ctrader-gateway.sock --metrics-port 9101
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse, os, socketserver, threading, time
+
+from backend import bar_store, ctrader_client, order_pipeline
+from backend.broker_ipc import recv_msg, send_msg
+from backend.metrics import CACHE_REQUESTS, render_metrics
+
+
+DEFAULT_SOCKET = "/tmp/ctrader-gateway.sock"
+BAR_CACHE_TTL = float(os.getenv("BROKER_BAR_CACHE_TTL", "2"))
+
+
+# ── bar cache ──────────────────────────────────────────────────────────────
+class BarCache:
+    """Full trendbar history per (symbol, timeframe), reused for `ttl` seconds."""
+
+    def __init__(self, ttl=BAR_CACHE_TTL):
+        self.ttl = ttl
+        self._bars = {}   # {(SYMBOL, tf): (fetched_at, bars)}
+        # one fetch per key at a time, so concurrent misses for it share one request
+        self._fetch_locks = {}   # {(SYMBOL, tf): Lock}
+        self._locks_guard = threading.Lock()
+
+    def _fresh(self, key):
+        hit = self._bars.get(key)
+        if hit and time.monotonic() - hit[0] < self.ttl:
+            return hit[1]
+        return None
+
+    def get(self, symbol, tf="D1", n=10):
+        key = (symbol.upper(), tf)
+        bars = self._fresh(key)
+        if bars is None:
+            with self._locks_guard:
+                lock = self._fetch_locks.setdefault(key, threading.Lock())
+            with lock:
+                bars = self._fresh(key)   # another caller may have filled it meanwhile
+                if bars is None:
+                    CACHE_REQUESTS.inc(cache="bars", result="miss")
+                    bars = ctrader_client.get_ohlc_data(symbol=symbol, tf=tf, n=None)
+                    try:
+                        bar_store.publish(symbol, tf, bars)
+                    except Exception as e:
+                        # the bars were fetched fine; shared-memory readers just miss this refresh
+                        print(f"[ERROR] bar_store publish {symbol} {tf}: {e}")
+                    if bars and self.ttl > 0:
+                        self._bars[key] = (time.monotonic(), bars)
+                    return bars[-n:] if n else bars
+        CACHE_REQUESTS.inc(cache="bars", result="hit")
+        return bars[-n:] if n else bars
+
+
+bar_cache = BarCache()
+
+OPERATIONS = {
+    "health": lambda: {"connected": ctrader_client.is_connected()},
+    "symbols": ctrader_client.get_symbols,
+    "ohlc": bar_cache.get,
+    "open_positions": ctrader_client.get_open_positions,
+    "pending_orders": ctrader_client.list_pending_orders,
+    "submit_intents": order_pipeline.submit_intents,
+    "order_status": order_pipeline.get_status,
+}
+
+
+def local_call(method, **params):
+    return OPERATIONS[method](**params)
+
+
+# ── socket server ──────────────────────────────────────────────────────────
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                request = recv_msg(self.request)
+            except (ConnectionError, OSError):
+                return
+            try:
+                result = local_call(request["method"], **request.get("params", {}))
+                reply = {"ok": True, "result": result}
+            except Exception as e:
+                reply = {"ok": False, "error": str(e), "type": type(e).__name__}
+            send_msg(self.request, reply)
+
+
+class GatewayServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128   # every worker thread holds its own connection
+
+
+def serve_metrics(port):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = render_metrics().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="cTrader broker gateway for multi-worker deployments.")
+    parser.add_argument("--socket", default=os.getenv("BROKER_GATEWAY_SOCKET", DEFAULT_SOCKET))
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics over HTTP")
+    args = parser.parse_args(argv)
+
+    if os.path.exists(args.socket):
+        os.remove(args.socket)   # stale socket from a previous run
+
+    threading.Thread(target=ctrader_client.init_client, daemon=True).start()
+    if args.metrics_port:
+        serve_metrics(args.metrics_port)
+
+    with GatewayServer(args.socket, _Handler) as server:
+        os.chmod(args.socket, 0o660)
+        print(f"[INFO] Broker gateway listening on {args.socket}")
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# broker_ipc.py
+# ---------------------------------------------------------------------------
+# Wire format between API workers and the broker gateway: length-prefixed
+# JSON over a Unix socket (4-byte big-endian size, like the cTrader framing).
+# This module must not import ctrader_client — workers never own a connection.
+
+import json, select, socket, struct, threading
+
+_HEADER = struct.Struct(">I")
+
+# exception types that survive the trip back to the worker; anything else → RuntimeError
+_ERRORS = {"ValueError": ValueError, "LookupError": LookupError, "KeyError": LookupError,
+           "RuntimeError": RuntimeError, "TimeoutError": TimeoutError}
+
+# Requests whose resend could repeat a side effect. The gateway dedupes intents by
+# client_msg_id only in memory: after a gateway restart its intent table is empty,
+# so resending submit_intents could place the orders a second time.
+_NOT_RESENT = {"submit_intents"}
+
+
+class GatewayUnavailable(RuntimeError):
+    """The gateway socket is missing, refused the connection or dropped it."""
+
+
+def send_msg(sock, obj):
+    data = json.dumps(obj).encode()
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _recv_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("broker gateway closed the connection")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def recv_msg(sock):
+    (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    return json.loads(_recv_exact(sock, size))
+
+
+class GatewayClient:
+    """Calls gateway operations; one persistent connection per worker thread."""
+
+    def __init__(self, path, timeout=60):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @staticmethod
+    def _alive(sock):
+        # a peer that closed (e.g. gateway restart) polls readable and reads as EOF;
+        # MSG_DONTWAIT alone would not help, a socket with a timeout waits before recv
+        try:
+            if not select.select([sock], [], [], 0)[0]:
+                return True
+            return sock.recv(1, socket.MSG_PEEK) != b""
+        except (OSError, ValueError):
+            return False
+
+    def _sock(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None and not self._alive(sock):
+            self._drop()
+            sock = None
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+                raise
+            self._local.sock = sock
+        return sock
+
+    def _drop(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+        self._local.sock = None
+
+    def call(self, method, **params):
+        """Run one gateway operation; socket failures raise GatewayUnavailable."""
+        request = {"method": method, "params": params}
+        for attempt in (1, 2):
+            try:
+                sock = self._sock()
+            except OSError as e:   # no socket file, connection refused, ...
+                self._drop()
+                raise GatewayUnavailable(f"broker gateway unavailable: {e}") from e
+            try:
+                send_msg(sock, request)
+                reply = recv_msg(sock)
+                break
+            except OSError as e:
+                self._drop()
+                # reconnect and resend once, unless the request may already have been
+                # applied (side effects, or a timeout while the gateway was still working)
+                if attempt == 2 or method in _NOT_RESENT or not isinstance(e, ConnectionError):
+                    raise GatewayUnavailable(f"broker gateway connection lost during '{method}': {e}") from e
+
+        if not reply.get("ok"):
+            raise _ERRORS.get(reply.get("type"), RuntimeError)(reply.get("error"))
+        return reply.get("result")
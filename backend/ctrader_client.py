@@ -4,23 +4,28 @@
 
 from ctrader_open_api import Client, Protobuf, TcpProtocol, EndPoints
 from ctrader_open_api.messages.OpenApiMessages_pb2 import (
+    ProtoOAErrorRes,
     ProtoOAApplicationAuthReq,
     ProtoOAAccountAuthReq,
     ProtoOASymbolsListReq,
+    ProtoOASymbolByIdReq,
     ProtoOAReconcileReq,
     ProtoOAGetTrendbarsReq,
-    ProtoOANewOrderReq,
-    ProtoOAAmendOrderReq,
-    ProtoOAAmendPositionSLTPReq,
+    ProtoOAGetTickDataReq,
 )
 from ctrader_open_api.messages.OpenApiModelMessages_pb2 import (
-    ProtoOAOrderType,
     ProtoOATradeSide,
     ProtoOATrendbarPeriod,
 )
-from twisted.internet import reactor
+from ctrader_open_api.messages.OpenApiCommonMessages_pb2 import ProtoMessage
+from twisted.internet import defer, reactor, threads
+from twisted.python.failure import Failure
+from twisted.python import threadable
+from ctrader_open_api.tcpProtocol import TcpProtocol as _TcpProtocol
+from collections import deque
+from backend.metrics import BROKER_ERRORS, BROKER_TIMEOUTS, Gauge, stage
 from datetime import datetime, timezone, timedelta
-import calendar, time, threading, json
+import calendar, time
 import os
 from dotenv import load_dotenv
 
@@ -33,36 +38,82 @@ CLIENT_SECRET = os.getenv("CTRADER_CLIENT_SECRET")
 ACCESS_TOKEN = os.getenv("CTRADER_ACCESS_TOKEN")
 ACCOUNT_ID = int(os.getenv("CTRADER_ACCOUNT_ID"))
 HOST_TYPE = os.getenv("CTRADER_HOST_TYPE")
-
-
-host = EndPoints.PROTOBUF_LIVE_HOST if HOST_TYPE.lower() == "live" else EndPoints.PROTOBUF_DEMO_HOST
-client = Client(host, EndPoints.PROTOBUF_PORT, TcpProtocol)
+# optional overrides, e.g. 127.0.0.1 / 5035 for the local simulator (benchmarks/ctrader_sim.py)
+HOST_OVERRIDE = os.getenv("CTRADER_HOST")
+PORT = int(os.getenv("CTRADER_PORT", EndPoints.PROTOBUF_PORT))
+# client-side send budgets; cTrader allows 5 req/s for historical data, 50 req/s for the rest
+HISTORY_MESSAGES_PER_SECOND = int(os.getenv("CTRADER_HISTORY_MESSAGES_PER_SECOND", "5"))
+TRADING_MESSAGES_PER_SECOND = int(os.getenv("CTRADER_TRADING_MESSAGES_PER_SECOND", "45"))
+
+_HISTORY_PAYLOADS = {ProtoOAGetTrendbarsReq().payloadType, ProtoOAGetTickDataReq().payloadType}
+
+
+class LaneProtocol(TcpProtocol):
+    """TcpProtocol with a separate budget for non-historical requests.
+
+    Trendbar/tick requests keep the library's queue, drained once a second at
+    HISTORY_MESSAGES_PER_SECOND. Everything else (orders, amends, reconcile, auth)
+    is written at once when sent from the reactor thread, as long as fewer than
+    TRADING_MESSAGES_PER_SECOND went out in the last second; the rest waits for
+    the next tick.
+    """
+    _trading_queue = deque()
+    _trading_sent_at = deque()   # monotonic send times within the last second
+
+    def send(self, message, instant=False, clientMsgId=None, isCanceled=None):
+        if instant or not hasattr(message, "payloadType") or message.payloadType in _HISTORY_PAYLOADS:
+            return super().send(message, instant, clientMsgId, isCanceled)
+        if not isinstance(message, ProtoMessage):
+            message = ProtoMessage(payload=message.SerializeToString(), clientMsgId=clientMsgId,
+                                   payloadType=message.payloadType)
+        self._trading_queue.append((isCanceled, message.SerializeToString()))
+        if threadable.isInIOThread():
+            self._send_trading()
+
+    def _send_trading(self):
+        now = time.monotonic()
+        while self._trading_sent_at and now - self._trading_sent_at[0] >= 1:
+            self._trading_sent_at.popleft()
+        while self._trading_queue and len(self._trading_sent_at) < TRADING_MESSAGES_PER_SECOND:
+            isCanceled, data = self._trading_queue.popleft()
+            if isCanceled is not None and isCanceled():
+                continue
+            self.sendString(data)
+            self._trading_sent_at.append(now)
+            self._lastSendMessageTime = datetime.now()
+
+    def _sendStrings(self):
+        self._send_trading()
+        super()._sendStrings()
+
+
+host = HOST_OVERRIDE or (EndPoints.PROTOBUF_LIVE_HOST if HOST_TYPE.lower() == "live" else EndPoints.PROTOBUF_DEMO_HOST)
+client = Client(host, PORT, LaneProtocol, numberOfMessagesToSendPerSecond=HISTORY_MESSAGES_PER_SECOND)
+
+Gauge("smc_broker_deferreds_in_flight", "Broker requests awaiting a response.",
+      fn=lambda: len(getattr(client, "_responseDeferreds", ())))
+Gauge("smc_broker_send_queue_depth", "Historical-data requests queued by the throttled broker protocol.",
+      fn=lambda: len(_TcpProtocol._send_queue))
+Gauge("smc_broker_trading_queue_depth", "Trading requests waiting for the per-second budget.",
+      fn=lambda: len(LaneProtocol._trading_queue))
 
 
 # ── symbol maps ────────────────────────────────────────────────────────────
 symbol_map        : dict[int, str] = {}   # {id: name}
 symbol_name_to_id : dict[str, int] = {}   # {name.upper(): id}
 symbol_digits_map : dict[int, int] = {}   # {id: digits}
-
-_PRICE_FACTOR = 100_000
-
-def _px(x):
-    """Convert float price → cTrader int format (e.g., 1.0935 → 109350)"""
-    return int(round(float(x) * _PRICE_FACTOR)) if x is not None else None
+symbol_volume_map : dict[int, tuple[int, int, int]] = {}   # {id: (min, step, max)} in order-volume units, 0 = unset
 
 
 # ── helpers ────────────────────────────────────────────────────────────────
-def pips_to_relative(pips: int, digits: int) -> int:
-    """Convert pips → 1/100 000 of price units (works for 2- to 5-digit symbols)."""
-    return pips * 10 ** (6 - digits)
-
 def on_error(failure):  # generic errback
+    BROKER_ERRORS.inc(error=getattr(failure, "type", type(failure)).__name__)
     print("[ERROR]", failure)
 
 # ── auth & symbol bootstrap ────────────────────────────────────────────────
 def symbols_response_cb(res):
     global symbol_map, symbol_name_to_id, symbol_digits_map
-    symbol_map.clear(); symbol_name_to_id.clear(); symbol_digits_map.clear()
+    symbol_map.clear(); symbol_name_to_id.clear(); symbol_digits_map.clear(); symbol_volume_map.clear()
 
     symbols = Protobuf.extract(res)
     for s in symbols.symbol:
@@ -75,6 +126,18 @@ def symbols_response_cb(res):
 
     print(f"[DEBUG] Loaded {len(symbol_map)} symbols.")
 
+    # the light symbol list has no volume limits; fetch the full symbols for order validation
+    if symbol_map:
+        req = ProtoOASymbolByIdReq(ctidTraderAccountId=ACCOUNT_ID, symbolId=list(symbol_map))
+        client.send(req).addCallbacks(symbol_details_cb, on_error)
+
+
+def symbol_details_cb(res):
+    details = Protobuf.extract(res)
+    for s in getattr(details, "symbol", ()):
+        symbol_volume_map[s.symbolId] = (s.minVolume, s.stepVolume, s.maxVolume)
+    print(f"[DEBUG] Loaded volume limits for {len(symbol_volume_map)} symbols.")
+
 
 # ── account‑level auth → ask for symbol list ─────────────────────────────
 def account_auth_cb(_):
@@ -99,17 +162,63 @@ def connected(_):
     req = ProtoOAApplicationAuthReq(clientId=CLIENT_ID, clientSecret=CLIENT_SECRET)
     client.send(req).addCallbacks(app_auth_cb, on_error)
 
+# callbacks(client, ProtoMessage) for every inbound message, e.g. execution events
+message_listeners = []
+
+def _on_message(c, message):
+    for listener in message_listeners:
+        try:
+            listener(c, message)
+        except Exception as e:
+            print(f"[ERROR] message listener {listener.__name__}: {e}")
+
 def init_client():
     client.setConnectedCallback(connected)
     client.setDisconnectedCallback(lambda c, r: print("[INFO] Disconnected:", r))
-    client.setMessageReceivedCallback(lambda c, m: None)
+    client.setMessageReceivedCallback(_on_message)
     client.startService()
     reactor.run(installSignalHandlers=False)
 
 
-# ── OHLC fetch (used by /fetch-data) ───────────────────────────────────────
-daily_bars, ready_event = [], threading.Event()
+# ── blocking request helper (worker / gateway handler threads) ────────────
+_ERROR_RES = ProtoOAErrorRes().payloadType
 
+def _request(req, name, timeout):
+    """Send `req` on the reactor thread and block until its response message arrives.
+
+    Each caller waits on its own Deferred, so concurrent requests never see each
+    other's replies. Raises TimeoutError when no reply comes within `timeout`
+    seconds and RuntimeError when the broker answers with ProtoOAErrorRes.
+    """
+    try:
+        if reactor.running:
+            res = threads.blockingCallFromThread(
+                reactor, client.send, req, responseTimeoutInSeconds=timeout)
+        else:
+            # no reactor (benchmarks' FakeClient): only an already-fired reply can be used
+            d = client.send(req, responseTimeoutInSeconds=timeout)
+            out = []
+            d.addBoth(out.append)
+            if not out:
+                d.cancel()
+                raise RuntimeError(f"{name}: broker reactor is not running")
+            res = out[0]
+            if isinstance(res, Failure):
+                res.raiseException()
+    except defer.TimeoutError:
+        BROKER_TIMEOUTS.inc(request=name)
+        raise TimeoutError(f"{name}: no broker reply within {timeout}s") from None
+    except Exception as e:
+        BROKER_ERRORS.inc(error=type(e).__name__)
+        raise
+    if res.payloadType == _ERROR_RES:
+        err = Protobuf.extract(res)
+        BROKER_ERRORS.inc(error=err.errorCode)
+        raise RuntimeError(f"{name}: {err.errorCode} {err.description}")
+    return res
+
+
+# ── OHLC fetch (used by /fetch-data) ───────────────────────────────────────
 def _trendbars_cb(res):
     bars = Protobuf.extract(res).trendbar
     def _tb(tb):
@@ -122,15 +231,10 @@ def _trendbars_cb(res):
             close  = (tb.low + tb.deltaClose)  / 100_000,
             volume = tb.volume,
         )
-    global daily_bars
-    daily_bars = list(map(_tb, bars))  # ✅ no slicing here
-    ready_event.set()
-
-
+    return list(map(_tb, bars))
 
 
 def get_ohlc_data(symbol: str, tf: str = "D1", n: int = 10):
-    ready_event.clear()
     sid = symbol_name_to_id.get(symbol.upper())
     if sid is None:
         raise ValueError(f"Unknown symbol '{symbol}'")
@@ -143,16 +247,13 @@ def get_ohlc_data(symbol: str, tf: str = "D1", n: int = 10):
         fromTimestamp       = int(calendar.timegm((now - timedelta(weeks=52)).utctimetuple())) * 1000,
         toTimestamp         = int(calendar.timegm(now.utctimetuple())) * 1000,
     )
-    client.send(req).addCallbacks(_trendbars_cb, on_error)
-    ready_event.wait(10)
-    return daily_bars[-n:]  # ✅ slicing is now safely done here
+    with stage("broker_fetch"):
+        bars = _trendbars_cb(_request(req, "trendbars", 10))
+    return bars[-n:] if n else bars
 
 
 # ── reconcile helpers ──────────────────────────────────────────────────────
-open_positions, pos_ready = [], threading.Event()
-
 def _reconcile_cb(res):
-    global open_positions
     open_positions = []
     rec = Protobuf.extract(res)
     for p in rec.position:
@@ -166,132 +267,38 @@ def _reconcile_cb(res):
                 volume_lots = td.volume / 10_000_000,  # 1 lot = 10 000 000
             )
         )
-    pos_ready.set()
+    return open_positions
 
 def get_open_positions():
-    pos_ready.clear()
     req = ProtoOAReconcileReq(ctidTraderAccountId = ACCOUNT_ID)
-    client.send(req).addCallbacks(_reconcile_cb, on_error)
-    pos_ready.wait(5)
-    return open_positions
-
-# ── core: place_order ──────────────────────────────────────────────────────
-def place_order(
-    *, client, account_id, symbol_id,
-    order_type, side, volume,
-    price=None, stop_loss=None, take_profit=None,
-    client_msg_id=None,
-):
-    # 1 lot  →  10 000 000 units   (✅ correct scale)
-    req = ProtoOANewOrderReq(
-        ctidTraderAccountId=account_id,
-        symbolId=symbol_id,
-        orderType=ProtoOAOrderType.Value(order_type.upper()),
-        tradeSide=ProtoOATradeSide.Value(side.upper()),
-        volume=int(volume),  # ✅ FIXED: Pass native volume units directly
-    )
-
-
-    # -------- absolute price fields are now plain floats ------------------
-    if order_type.upper() == "LIMIT":
-        if price is None:
-            raise ValueError("Limit order requires price.")
-        req.limitPrice = float(price)          # e.g. 1.17700
-    elif order_type.upper() == "STOP":
-        if price is None:
-            raise ValueError("Stop order requires price.")
-        req.stopPrice = float(price)
-
-    if order_type.upper() in ("LIMIT", "STOP"):
-        if stop_loss   is not None:
-            req.stopLoss   = float(stop_loss)
-        if take_profit is not None:
-            req.takeProfit = float(take_profit)
-    # ---------------------------------------------------------------------
-
-    # MARKET orders → relative distances (still 1 / 100 000 units)
-    else:
-        digits = symbol_digits_map.get(symbol_id, 5)
-        if stop_loss is not None:
-            req.relativeStopLoss   = pips_to_relative(int(stop_loss),   digits)
-        if take_profit is not None:
-            req.relativeTakeProfit = pips_to_relative(int(take_profit), digits)
-
-    print(
-        f"[DEBUG] Sending order: {order_type=} {side=} "
-        f"price={price} SL={stop_loss} TP={take_profit}"
-    )
-    d = client.send(req, client_msg_id=client_msg_id, timeout=12)
-
-    # legacy patch after MARKET fill (unchanged)
-    if order_type.upper() == "MARKET":
-        def _delayed_sltp(_):
-            time.sleep(8)
-            open_pos = get_open_positions()
-            for p in open_pos:
-                if (
-                    p["symbol_name"].upper() == symbol_map[symbol_id].upper()
-                    and p["direction"].upper() == side.upper()
-                ):
-                    return modify_position_sltp(
-                        client=client,
-                        account_id=account_id,
-                        position_id=p["position_id"],
-                        stop_loss=stop_loss,
-                        take_profit=take_profit,
-                    )
-            return {"status": "position_not_found"}
-        d.addCallback(_delayed_sltp)
-
-
-    return d
-
-
-
-
-
-# ── amend helpers (rarely needed with new logic) ───────────────────────────
-def modify_position_sltp(client, account_id, position_id, stop_loss=None, take_profit=None):
-    req = ProtoOAAmendPositionSLTPReq(ctidTraderAccountId = account_id, positionId = position_id)
-    if stop_loss   is not None: req.stopLoss   = _px(stop_loss)    # 🔁 use _px()
-    if take_profit is not None: req.takeProfit = _px(take_profit)  # 🔁 use _px()
-    return client.send(req)
-
-
-def modify_pending_order_sltp(client, account_id, order_id, version, stop_loss=None, take_profit=None):
-    req = ProtoOAAmendOrderReq(
-        ctidTraderAccountId = account_id,
-        orderId             = order_id,
-        version             = version,
-    )
-    if stop_loss   is not None: req.stopLoss   = stop_loss
-    if take_profit is not None: req.takeProfit = take_profit
-    return client.send(req)
-
-# ── blocking helper used by FastAPI layer ─────────────────────────────────
-def wait_for_deferred(deferred, timeout=40):
-    try:
-        return deferred.result(timeout=timeout)
-    except Exception as e:
-        print(f"[FATAL] Deferred result timeout or failure: {e}")
-        return {"status": "failed", "error": str(e)}
+    with stage("broker_reconcile"):
+        return _reconcile_cb(_request(req, "reconcile", 5))
 
 
 def get_pending_orders():
     request = ProtoOAReconcileReq()
     request.ctidTraderAccountId = ACCOUNT_ID
 
-    result_ready = threading.Event()
-    orders = []
+    with stage("broker_reconcile"):
+        res = Protobuf.extract(_request(request, "pending_orders", 5))
+    return list(res.order)  # only pending orders
+
+
+# ── plain-data views (JSON-safe, used by the API layer / broker gateway) ───
+def is_connected():
+    return bool(getattr(client, "isConnected", False))
 
-    def callback(response):
-        res = Protobuf.extract(response)
-        orders.extend(res.order)  # only pending orders
-        result_ready.set()
 
-    d = client.send(request)
-    d.addCallbacks(callback, on_error)
-    result_ready.wait(timeout=5)
+def get_symbols():
+    return list(symbol_map.values())
 
-    return orders
 
+def list_pending_orders():
+    return [ {
+        "order_id": o.orderId,
+        "symbol": symbol_map.get(o.tradeData.symbolId),
+        "type": "LIMIT" if o.orderType == 2 else "STOP",
+        "side": "buy" if o.tradeData.tradeSide == 1 else "sell",
+        "price": getattr(o, "limitPrice", getattr(o, "stopPrice", 0)) / 100_000,
+        "volume": o.tradeData.volume / 10_000_000,
+    } for o in get_pending_orders() ]
@@ -4,6 +4,7 @@ import pandas as pd
 import plotly.graph_objects as go
 import tempfile, os, base64, re
 from backend.smc_features import build_feature_snapshot
+from backend.metrics import stage
 
 class TradeDecision:
     def __init__(self, signal: str, sl: float = None, tp: float = None, confidence: float = None, reasons=None):
@@ -22,13 +23,129 @@ class TradeDecision:
             "reasons": self.reasons
         }
 
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://host.docker.internal:11434/api/generate")
+OLLAMA_MODEL = "llava"
+
+# JSON schema handed to Ollama's `format` option so generation is constrained
+# to a parseable TradeDecision instead of free text around a JSON block.
+TRADE_DECISION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "signal": {"type": "string", "enum": ["long", "short", "no_trade"]},
+        "sl": {"type": ["number", "null"]},
+        "tp": {"type": ["number", "null"]},
+        "confidence": {"type": "number"},
+        "explanation": {"type": "string"},
+    },
+    "required": ["signal", "sl", "tp", "confidence", "explanation"],
+}
+
+_json_decoder = json.JSONDecoder()
+
+
+def _ollama_generate(prompt: str, images=None) -> str:
+    payload = {
+        "model": OLLAMA_MODEL,
+        "prompt": prompt,
+        "format": TRADE_DECISION_SCHEMA,
+        "stream": False,
+    }
+    if images:
+        payload["images"] = images
+
+    with stage("llm_inference"):
+        response = requests.post(OLLAMA_URL, headers={"Content-Type": "application/json"}, json=payload)
+    if response.status_code != 200:
+        raise RuntimeError(f"Ollama API error: {response.status_code}, {response.text}")
+    return response.json().get("response", "").strip()
+
+
+def _extract_json(content: str):
+    """Return (object, trailing_text) for the first decodable JSON object in content."""
+    content = re.sub(r"```(?:json)?", "", content)
+    start = content.find("{")
+    while start != -1:
+        try:
+            obj, end = _json_decoder.raw_decode(content, start)
+            if isinstance(obj, dict):
+                return obj, content[end:]
+        except ValueError:
+            pass
+        start = content.find("{", start + 1)
+    return None, content
+
+
+def _to_float(value):
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _validate_decision(td: TradeDecision, price: float):
+    """Return a list of problems with the decision relative to the current price."""
+    errors = []
+    if td.signal not in ("long", "short", "no_trade"):
+        errors.append(f"unknown signal {td.signal!r}")
+        return errors
+    if td.signal == "no_trade":
+        return errors
+
+    if td.sl is None or td.tp is None:
+        errors.append("sl and tp are required for a trade signal")
+        return errors
+    if td.signal == "long" and not td.sl < price < td.tp:
+        errors.append(f"long needs sl < {price} < tp, got sl={td.sl}, tp={td.tp}")
+    if td.signal == "short" and not td.tp < price < td.sl:
+        errors.append(f"short needs tp < {price} < sl, got sl={td.sl}, tp={td.tp}")
+    return errors
+
+
+def _decision_from_content(content: str, price: float):
+    """Parse raw LLM output into (TradeDecision or None, errors)."""
+    parsed, trailing = _extract_json(content)
+    if parsed is None:
+        return None, ["no JSON object found in LLM response"]
+
+    explanation = parsed.get("explanation") or trailing.strip()
+    explanation = re.sub(r"^Explanation:\s*", "", explanation, flags=re.IGNORECASE).strip()
+
+    td = TradeDecision(
+        signal=str(parsed.get("signal", "")).strip().lower(),
+        sl=_to_float(parsed.get("sl")),
+        tp=_to_float(parsed.get("tp")),
+        confidence=_to_float(parsed.get("confidence")),
+        reasons=[explanation] if explanation else [],
+    )
+    return td, _validate_decision(td, price)
+
+
+def _repair_prompt(content: str, errors, price: float) -> str:
+    return f"""
+Your previous trading decision was rejected.
+
+Previous output:
+{content}
+
+Problems:
+{chr(10).join(f"- {e}" for e in errors)}
+
+Current price is {price}. Return the corrected decision as a single JSON object with
+"signal", "sl", "tp", "confidence" and "explanation". If no valid trade exists, use "no_trade".
+""".strip()
+
+
 async def analyze_chart_with_llm(fig, df: pd.DataFrame, symbol: str, timeframe: str, indicators=[]):
     last_rows = df.tail(50)[['open', 'high', 'low', 'close']]
-    smc_summary = build_feature_snapshot(df)
+    price = float(df['close'].iloc[-1])
+    with stage("smc_features"):
+        smc_summary = build_feature_snapshot(df)
     smc_text = "\n".join([f"- {k}: {v}" for k, v in smc_summary.items() if v is not None]) or "No strong SMC features detected."
 
     fig.update_layout(width=800, height=400)
-    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
+    with stage("chart_render"), tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
         fig.write_image(tmp.name)
         chart_path = tmp.name
 
@@ -58,55 +175,33 @@ Make a trading decision using SMC methodology:
 - Market structure
 - Trend strength
 
-Respond in this format **exactly**:
+Respond with a single JSON object only:
 
 {{
   "signal": "long" | "short" | "no_trade",
   "sl": float,
   "tp": float,
-  "confidence": float
+  "confidence": float,
+  "explanation": "plain English explanation of the decision"
 }}
 
-Then on the next line, write a plain English explanation outside the JSON, like this:
-
-Explanation:
-Your explanation goes here.
-
-⚠ Do NOT include triple backticks or any markdown. Respond only with the JSON and plain explanation below it.
+Current price is {price}. For "long" the sl must be below and the tp above the current price;
+for "short" the sl must be above and the tp below it.
 """.strip()
 
     try:
-        response = requests.post(
-            "http://host.docker.internal:11434/api/generate",
-            headers={"Content-Type": "application/json"},
-            json={
-                "model": "llava",
-                "prompt": prompt,
-                "images": [img_b64],
-                "stream": False
-            }
-        )
-
-        if response.status_code != 200:
-            raise RuntimeError(f"Ollama API error: {response.status_code}, {response.text}")
-
-        content = response.json().get("response", "").strip()
-
-        # Extract JSON part
-        match = re.search(r'\{.*?\}', content, re.DOTALL)
-        if not match:
-            raise ValueError("No JSON object found in LLM response.")
-        json_block = match.group(0).strip()
-
-        # Extract explanation
-        explanation = content[match.end():].strip()
-        explanation = re.sub(r"^Explanation:\s*", "", explanation, flags=re.IGNORECASE).strip()
-
-        parsed = json.loads(json_block)
-        return TradeDecision(**parsed, reasons=[explanation])
-
-    except Exception as e:
-        raise ValueError(f"❌ Failed to parse LLM response: {e}\nRaw content:\n{content}")
+        content = _ollama_generate(prompt, images=[img_b64])
+        decision, errors = _decision_from_content(content, price)
+
+        # one cheap, text-only repair pass instead of re-running the vision prompt
+        if errors:
+            print(f"[WARN] LLM decision rejected ({'; '.join(errors)}), retrying once.")
+            content = _ollama_generate(_repair_prompt(content, errors, price))
+            decision, errors = _decision_from_content(content, price)
+
+        if errors:
+            return TradeDecision("no_trade", reasons=[f"LLM output rejected: {'; '.join(errors)}"])
+        return decision
 
     finally:
         if os.path.exists(chart_path):
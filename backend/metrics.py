@@ -0,0 +1,283 @@
+# metrics.py
+# ---------------------------------------------------------------------------
+# Minimal Prometheus-style metrics (text exposition format) and per-stage
+# timing for the request pipeline. Stages also become OpenTelemetry spans
+# when `opentelemetry-api` is installed, and are reported per request in a
+# `Server-Timing` header by the middleware in app.py.
+#
+# With METRICS_MULTIPROC_DIR set, every process writes a JSON snapshot of
+# its registry there once a second and a scrape renders the sum of all
+# snapshots, so any uvicorn worker answers for the whole pool.
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+import atexit, json, os, threading, time
+
+try:
+    from opentelemetry import trace as _otel_trace
+    _tracer = _otel_trace.get_tracer("llm-smc")
+except ImportError:  # optional
+    _tracer = None
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registry = []
+_stage_timings: ContextVar = ContextVar("stage_timings", default=None)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, doc, labelnames=()):
+        self.name, self.doc, self.labelnames = name, doc, tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def collect(self):
+        with self._lock:
+            return list(self._values.items())
+
+    def render(self, items=None):
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in self.collect() if items is None else items:
+            lines.extend(self._render_one(key, value))
+        return lines
+
+    # snapshot (de)serialisation and cross-process merge
+    def _dump(self, value):
+        return value
+
+    def _load(self, value):
+        return value
+
+    def _merge(self, a, b):
+        return a + b
+
+    def _render_one(self, key, value):
+        return [f"{self.name}{_fmt_labels(self.labelnames, key)} {value}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Settable gauge; pass `fn` to sample the value at scrape time instead."""
+    kind = "gauge"
+
+    def __init__(self, name, doc, labelnames=(), fn=None):
+        super().__init__(name, doc, labelnames)
+        self._fn = fn
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def collect(self):
+        if self._fn is not None:
+            try:
+                self.set(self._fn())
+            except Exception:
+                pass
+        return super().collect()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, doc, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, n = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, n + 1)
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def _dump(self, value):
+        return list(value)
+
+    def _load(self, value):
+        return tuple(value)
+
+    def _merge(self, a, b):
+        return [x + y for x, y in zip(a[0], b[0])], a[1] + b[1], a[2] + b[2]
+
+    def _render_one(self, key, value):
+        counts, total, n = value
+        lines = [
+            f"{self.name}_bucket{_fmt_labels(self.labelnames, key, [('le', b)])} {c}"
+            for b, c in zip(self.buckets, counts)
+        ]
+        lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, [('le', '+Inf')])} {n}")
+        lines.append(f"{self.name}_sum{_fmt_labels(self.labelnames, key)} {total}")
+        lines.append(f"{self.name}_count{_fmt_labels(self.labelnames, key)} {n}")
+        return lines
+
+
+def render_metrics() -> str:
+    if MULTIPROC_DIR:
+        return _render_multiprocess()
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ── multi-worker aggregation ───────────────────────────────────────────────
+MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR")
+SNAPSHOT_INTERVAL = 1.0   # seconds; other workers' values are at most this stale
+_snapshot_lock = threading.Lock()   # the writer loop and scrapes both write our file
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def write_snapshot():
+    """Write this process's registry to METRICS_MULTIPROC_DIR/<pid>.json (atomic replace)."""
+    snapshot = {m.name: [[list(k), m._dump(v)] for k, v in m.collect()] for m in _registry}
+    path = os.path.join(MULTIPROC_DIR, f"{os.getpid()}.json")
+    with _snapshot_lock:
+        with open(path + ".tmp", "w") as f:
+            json.dump(snapshot, f)
+        os.replace(path + ".tmp", path)
+
+
+def _render_multiprocess():
+    write_snapshot()
+    merged = {m.name: {} for m in _registry}
+    for entry in os.scandir(MULTIPROC_DIR):
+        if not entry.name.endswith(".json"):
+            continue
+        try:
+            with open(entry.path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue   # removed or replaced mid-read
+        # counters and histograms of exited workers still count; their gauges do not
+        alive = _pid_alive(int(entry.name[:-5]))
+        for metric in _registry:
+            if metric.kind == "gauge" and not alive:
+                continue
+            values = merged[metric.name]
+            for key, value in snapshot.get(metric.name, ()):
+                key, value = tuple(key), metric._load(value)
+                values[key] = metric._merge(values[key], value) if key in values else value
+
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render(list(merged[metric.name].items())))
+    return "\n".join(lines) + "\n"
+
+
+def start_snapshot_writer():
+    """Keep this worker's snapshot fresh for scrapes served by other workers."""
+    if not MULTIPROC_DIR:
+        return
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+    def loop():
+        while True:
+            try:
+                write_snapshot()
+            except OSError as e:
+                print(f"[ERROR] metrics snapshot: {e}")
+            time.sleep(SNAPSHOT_INTERVAL)
+
+    threading.Thread(target=loop, daemon=True).start()
+    atexit.register(write_snapshot)
+
+
+# ── pipeline metrics ───────────────────────────────────────────────────────
+STAGE_SECONDS = Histogram(
+    "smc_stage_duration_seconds", "Time spent in each pipeline stage.", ["stage"],
+)
+HTTP_SECONDS = Histogram(
+    "smc_http_request_duration_seconds", "HTTP request latency by route.", ["method", "route", "status"],
+)
+HTTP_IN_FLIGHT = Gauge("smc_http_requests_in_flight", "HTTP requests currently being served.")
+BROKER_TIMEOUTS = Counter(
+    "smc_broker_timeouts_total", "Broker requests that did not answer in time.", ["request"],
+)
+BROKER_ERRORS = Counter("smc_broker_errors_total", "Broker errbacks by failure type.", ["error"])
+CACHE_REQUESTS = Counter("smc_cache_requests_total", "Cache lookups by cache and hit/miss.", ["cache", "result"])
+
+
+# ── stage timing / spans ───────────────────────────────────────────────────
+@contextmanager
+def stage(name: str):
+    """Time a pipeline stage into STAGE_SECONDS, the request's Server-Timing and an OTel span."""
+    span = _tracer.start_as_current_span(name) if _tracer else None
+    if span:
+        span.__enter__()
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        timings = _stage_timings.get()
+        if timings is not None:
+            timings.append((name, elapsed))
+        if span:
+            span.__exit__(None, None, None)
+
+
+def start_request_timings():
+    """Begin collecting stage timings for the current request; returns the list to read back."""
+    timings = []
+    _stage_timings.set(timings)
+    return timings
+
+
+def server_timing_header(timings) -> str:
+    return ", ".join(f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in timings)
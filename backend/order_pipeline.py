@@ -0,0 +1,298 @@
+# order_pipeline.py
+# ---------------------------------------------------------------------------
+# Order-intent pipeline. A batch of intents is validated against the cached
+# symbol maps, every ProtoOANewOrderReq is sent in one go on the reactor
+# thread, and each intent is tracked by its idempotent client_msg_id from the
+# execution events the broker pushes back — no thread blocks on a Deferred.
+# Runs wherever the cTrader connection lives (in-process or broker_gateway).
+
+from ctrader_open_api import Protobuf
+from ctrader_open_api.messages.OpenApiMessages_pb2 import (
+    ProtoOANewOrderReq,
+    ProtoOAAmendPositionSLTPReq,
+)
+from ctrader_open_api.messages.OpenApiModelMessages_pb2 import (
+    ProtoOAExecutionType,
+    ProtoOAOrderType,
+    ProtoOATradeSide,
+)
+from twisted.internet import reactor
+import threading, time, uuid
+
+from backend import ctrader_client
+from backend.metrics import Counter, Gauge
+
+
+ORDER_TIMEOUT = 25        # seconds for the broker to acknowledge an order
+ORDER_DEADLINE = 60       # seconds from submission until an intent is forced into a final state
+RETENTION = 3600          # seconds finished intents stay queryable
+MAX_TRACKED = 10_000      # least recently updated finished intents are forgotten beyond this
+_SLTP_SUFFIX = ":sltp"
+
+ORDER_INTENTS = Counter("smc_order_intents_total", "Order intents by submission result.", ["result"])
+
+_intents: dict[str, dict] = {}   # {client_msg_id: record}
+_lock = threading.Lock()
+
+Gauge("smc_order_intents_in_flight", "Order intents not yet in a final state.",
+      fn=lambda: sum(1 for r in list(_intents.values()) if not r["done"]))
+
+
+# ── validation ─────────────────────────────────────────────────────────────
+def _volume_units(lots):
+    return round(lots * 10_000_000)   # 1 lot = 10 000 000 units
+
+
+def _reject(record, code, error):
+    record.update(status="rejected", done=True, error_code=code, error=error)
+    return record
+
+
+def validate_intent(intent: dict) -> dict:
+    """Build the tracking record for an intent; rejected records carry error_code/error."""
+    order_type = str(intent.get("order_type") or "MARKET").upper()
+    direction = str(intent.get("direction") or "").upper()
+    record = {
+        "client_msg_id": intent.get("client_msg_id") or uuid.uuid4().hex,
+        "symbol": str(intent.get("symbol") or "").upper(),
+        "direction": direction,
+        "order_type": order_type,
+        "volume": intent.get("volume", 1.0),
+        "entry_price": intent.get("entry_price"),
+        "stop_loss": intent.get("stop_loss"),
+        "take_profit": intent.get("take_profit"),
+        "status": "queued",
+        "done": False,
+        "order_id": None,
+        "position_id": None,
+        "error_code": None,
+        "error": None,
+        "sltp_error": None,
+        "sltp_set": False,
+        "deadline": None,         # epoch seconds by which a sent intent is final
+        "updated": time.time(),
+    }
+
+    if not ctrader_client.symbol_name_to_id:
+        return _reject(record, "SYMBOLS_NOT_LOADED", "Symbols not loaded yet.")
+    if record["symbol"] not in ctrader_client.symbol_name_to_id:
+        return _reject(record, "UNKNOWN_SYMBOL", f"Symbol '{intent.get('symbol')}' not found.")
+    if direction not in ("BUY", "SELL"):
+        return _reject(record, "INVALID_INTENT", f"Unknown direction '{intent.get('direction')}'.")
+    if order_type not in ("MARKET", "LIMIT", "STOP"):
+        return _reject(record, "INVALID_INTENT", f"Unsupported order type '{order_type}'.")
+    if not record["volume"] or record["volume"] <= 0:
+        return _reject(record, "INVALID_INTENT", "Volume must be positive.")
+    # limits arrive shortly after the symbol list; until then the broker checks the volume itself
+    sid = ctrader_client.symbol_name_to_id[record["symbol"]]
+    lo, step, hi = ctrader_client.symbol_volume_map.get(sid, (0, 0, 0))
+    units = _volume_units(record["volume"])
+    if units < lo or (hi and units > hi) or (step and units % step):
+        return _reject(record, "INVALID_VOLUME",
+                       f"Volume {record['volume']} lots is outside {lo / 1e7}-{hi / 1e7} lots "
+                       f"or not a multiple of {step / 1e7} for {record['symbol']}.")
+
+    entry, sl, tp = record["entry_price"], record["stop_loss"], record["take_profit"]
+    if order_type != "MARKET":
+        if entry is None:
+            return _reject(record, "INVALID_INTENT", f"{order_type.title()} order requires entry_price.")
+        below, above = (sl, tp) if direction == "BUY" else (tp, sl)
+        if (below is not None and below >= entry) or (above is not None and above <= entry):
+            return _reject(record, "INVALID_INTENT", f"SL/TP on the wrong side of entry {entry} for {direction}.")
+    return record
+
+
+# ── sending (reactor thread) ───────────────────────────────────────────────
+def _new_order_req(record):
+    req = ProtoOANewOrderReq(
+        ctidTraderAccountId=ctrader_client.ACCOUNT_ID,
+        symbolId=ctrader_client.symbol_name_to_id[record["symbol"]],
+        orderType=ProtoOAOrderType.Value(record["order_type"]),
+        tradeSide=ProtoOATradeSide.Value(record["direction"]),
+        volume=_volume_units(record["volume"]),
+        clientOrderId=record["client_msg_id"][:50],
+    )
+    if record["order_type"] == "LIMIT":
+        req.limitPrice = float(record["entry_price"])
+    elif record["order_type"] == "STOP":
+        req.stopPrice = float(record["entry_price"])
+    if record["order_type"] != "MARKET":
+        if record["stop_loss"] is not None:
+            req.stopLoss = float(record["stop_loss"])
+        if record["take_profit"] is not None:
+            req.takeProfit = float(record["take_profit"])
+    return req
+
+
+def _update(client_msg_id, **changes):
+    with _lock:
+        record = _intents.get(client_msg_id)
+        if record is None:
+            return None
+        record.update(changes, updated=time.time())
+        return record
+
+
+def _sltp_failed(client_msg_id, error):
+    # the position is open either way: report it as filled, never as a failed order
+    _update(client_msg_id, status="filled", done=True, sltp_error=error)
+
+
+def _on_order_timeout(failure, client_msg_id):
+    record = _intents.get(client_msg_id)
+    if record is not None and record["status"] == "sent":
+        _update(client_msg_id, status="timeout", done=True,
+                error_code="TIMEOUT", error=str(failure.getErrorMessage()))
+    return None
+
+
+def _on_amend_timeout(failure, client_msg_id):
+    record = _intents.get(client_msg_id)
+    if record is not None and record["status"] == "amending":
+        _sltp_failed(client_msg_id, f"SL/TP amend got no answer: {failure.getErrorMessage()}")
+    return None
+
+
+def _send(req, key, errback):
+    d = ctrader_client.client.send(req, clientMsgId=key, responseTimeoutInSeconds=ORDER_TIMEOUT)
+    # replies are handled in on_message; the Deferred only reports missing answers
+    d.addErrback(errback, key.split(_SLTP_SUFFIX)[0])
+
+
+def _expire(client_msg_id):
+    """Deadline: an accepted market order whose fill never arrives (e.g. after a disconnect)."""
+    record = _intents.get(client_msg_id)
+    if record is None or record["done"]:
+        return
+    if record["status"] == "amending":
+        _sltp_failed(client_msg_id, f"SL/TP amend got no answer within {ORDER_DEADLINE}s")
+    else:
+        _update(client_msg_id, status="timeout", done=True, error_code="TIMEOUT",
+                error=f"No final execution event within {ORDER_DEADLINE}s; check open positions")
+
+
+def _send_batch(records):
+    for record in records:
+        _update(record["client_msg_id"], status="sent")
+        _send(_new_order_req(record), record["client_msg_id"], _on_order_timeout)
+        reactor.callLater(max(0.0, record["deadline"] - time.time()), _expire, record["client_msg_id"])
+
+
+def _amend_sltp(record):
+    req = ProtoOAAmendPositionSLTPReq(
+        ctidTraderAccountId=ctrader_client.ACCOUNT_ID, positionId=record["position_id"],
+    )
+    if record["stop_loss"] is not None:
+        req.stopLoss = float(record["stop_loss"])
+    if record["take_profit"] is not None:
+        req.takeProfit = float(record["take_profit"])
+    _send(req, record["client_msg_id"] + _SLTP_SUFFIX, _on_amend_timeout)
+
+
+# ── execution events (reactor thread) ──────────────────────────────────────
+def on_message(_client, message):
+    """Route execution / error events for tracked client_msg_ids into their records."""
+    key = message.clientMsgId
+    if not key:
+        return
+    client_msg_id = key.split(_SLTP_SUFFIX)[0]
+    record = _intents.get(client_msg_id)
+    if record is None:
+        return
+
+    payload = Protobuf.extract(message)
+    name = type(payload).__name__
+    is_amend = key.endswith(_SLTP_SUFFIX)
+
+    if name in ("ProtoOAOrderErrorEvent", "ProtoOAErrorRes"):
+        if is_amend:
+            _sltp_failed(client_msg_id, f"{payload.errorCode}: {payload.description}")
+        else:
+            _update(client_msg_id, status="rejected", done=True,
+                    error_code=payload.errorCode, error=payload.description)
+        return
+    if name != "ProtoOAExecutionEvent":
+        return
+
+    et = payload.executionType
+    if is_amend:
+        if et == ProtoOAExecutionType.ORDER_REPLACED:
+            _update(client_msg_id, status="filled", done=True, sltp_set=True, sltp_error=None)
+        return
+
+    if et == ProtoOAExecutionType.ORDER_ACCEPTED:
+        if not record["done"]:   # never reopen an intent that already hit its deadline
+            _update(client_msg_id, status="accepted", order_id=payload.order.orderId,
+                    done=record["order_type"] != "MARKET")
+    elif et in (ProtoOAExecutionType.ORDER_FILLED, ProtoOAExecutionType.ORDER_PARTIAL_FILL):
+        if record["status"] in ("amending", "filled"):
+            return   # later fills of the same order; SL/TP is already being set
+        # a fill after the deadline still gets its SL/TP (the amend has its own timeout)
+        needs_sltp = record["order_type"] == "MARKET" and (
+            record["stop_loss"] is not None or record["take_profit"] is not None
+        )
+        record = _update(
+            client_msg_id, status="amending" if needs_sltp else "filled", done=not needs_sltp,
+            order_id=payload.order.orderId, position_id=payload.position.positionId,
+        )
+        if needs_sltp:
+            _amend_sltp(record)
+    elif et in (ProtoOAExecutionType.ORDER_REJECTED, ProtoOAExecutionType.ORDER_CANCELLED,
+                ProtoOAExecutionType.ORDER_EXPIRED):
+        _update(client_msg_id, status="rejected", done=True,
+                error_code=payload.errorCode or ProtoOAExecutionType.Name(et),
+                error=ProtoOAExecutionType.Name(et))
+
+
+ctrader_client.message_listeners.append(on_message)
+
+
+# ── public API (any thread) ────────────────────────────────────────────────
+def _evict(now):
+    """Forget finished intents past RETENTION, or the least recently updated beyond MAX_TRACKED.
+
+    Unfinished intents are never evicted; ORDER_DEADLINE bounds how long they stay so.
+    """
+    finished = sorted((r["updated"], c) for c, r in _intents.items() if r["done"])
+    expired = sum(1 for updated, _ in finished if now - updated > RETENTION)
+    for _, c in finished[:max(expired, len(_intents) - MAX_TRACKED)]:
+        del _intents[c]
+
+
+def submit_intents(intents):
+    """Validate and send a batch; returns one acknowledgement per intent, in order.
+
+    Resubmitting a client_msg_id is answered from `_intents`, which lives in this
+    process only: after a gateway restart the same id would be sent again.
+    """
+    acks, to_send = [], []
+    with _lock:
+        for intent in intents:
+            existing = _intents.get(intent.get("client_msg_id") or "")
+            if existing is not None:
+                # idempotent resubmission: report, never resend
+                ORDER_INTENTS.inc(result="duplicate")
+                acks.append(dict(existing, duplicate=True))
+                continue
+
+            record = validate_intent(intent)
+            ORDER_INTENTS.inc(result="rejected" if record["done"] else "submitted")
+            if not record["done"]:
+                # only intents that reach the broker claim their id; rejected ones
+                # (e.g. SYMBOLS_NOT_LOADED at startup) may be retried under the same id
+                record["deadline"] = time.time() + ORDER_DEADLINE
+                _intents[record["client_msg_id"]] = record
+                to_send.append(record)
+            acks.append(dict(record))
+
+        _evict(time.time())
+
+    if to_send:
+        reactor.callFromThread(_send_batch, to_send)
+    return acks
+
+
+def get_status(client_msg_ids):
+    with _lock:
+        return [dict(_intents[c]) if c in _intents else {"client_msg_id": c, "status": "unknown", "done": True}
+                for c in client_msg_ids]
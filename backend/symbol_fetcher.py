@@ -1,7 +1,7 @@
 ## symbol_fetcher.py
 
-from backend.ctrader_client import symbol_map
+from backend import broker
 
 def get_available_symbols():
     """Fetch all available trading symbols from cTrader."""
-    return list(symbol_map.values())
+    return broker.get_symbols()
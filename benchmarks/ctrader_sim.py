@@ -0,0 +1,319 @@
+# ctrader_sim.py
+# ---------------------------------------------------------------------------
+# Localhost stand-in for the cTrader Open API, speaking the same framed
+# ProtoMessage protocol (TLS + int32 length prefix) as the real endpoint.
+#
+#   python -m benchmarks.ctrader_sim --port 5035 --latency 0.05 --ollama-port 11435
+#
+# then point the app at it:
+#
+#   CTRADER_HOST=127.0.0.1 CTRADER_PORT=5035 \
+#   OLLAMA_URL=http://127.0.0.1:11435/api/generate uvicorn backend.app:app --port 4000
+
+from ctrader_open_api import Protobuf
+from ctrader_open_api.messages.OpenApiCommonMessages_pb2 import ProtoMessage, ProtoHeartbeatEvent
+from ctrader_open_api.messages.OpenApiMessages_pb2 import (
+    ProtoOAApplicationAuthRes,
+    ProtoOAAccountAuthRes,
+    ProtoOASymbolsListRes,
+    ProtoOASymbolByIdRes,
+    ProtoOAReconcileRes,
+    ProtoOAExecutionEvent,
+    ProtoOASpotEvent,
+    ProtoOASubscribeSpotsRes,
+    ProtoOAUnsubscribeSpotsRes,
+    ProtoOAErrorRes,
+)
+from ctrader_open_api.messages.OpenApiModelMessages_pb2 import (
+    ProtoOAExecutionType,
+    ProtoOAOrderStatus,
+    ProtoOAOrderType,
+    ProtoOAPositionStatus,
+    ProtoOATrendbarPeriod,
+)
+from twisted.internet import reactor, ssl, task
+from twisted.internet.protocol import ServerFactory
+from twisted.protocols.basic import Int32StringReceiver
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from datetime import datetime, timedelta, timezone
+from benchmarks.fakes import (
+    DEFAULT_SYMBOLS, FakeOllama, PERIOD_MINUTES, symbol_details, synthetic_trendbars, wrap,
+)
+import argparse, itertools, random, time
+
+
+_HEARTBEAT = ProtoHeartbeatEvent().payloadType
+_PERIOD_NAMES = {v: k for k, v in ProtoOATrendbarPeriod.items()}
+
+
+class SimBroker:
+    """Account state shared by every connection: symbols, prices, positions and orders."""
+
+    def __init__(self, symbols=DEFAULT_SYMBOLS, max_bars=100_000, latency=0.0, jitter=0.0,
+                 spot_interval=1.0, seed=0):
+        self.symbols = {i: name for i, name in enumerate(symbols, start=1)}
+        self.max_bars = max_bars
+        self.latency = latency
+        self.jitter = jitter
+        self.spot_interval = spot_interval
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.prices = {sid: 1.0 + 0.1 * sid for sid in self.symbols}   # mid, in price units
+        self.positions = {}   # {positionId: ProtoOAPosition}
+        self.orders = {}      # {orderId: ProtoOAOrder}
+        self._ids = itertools.count(1)
+        self._bars = {}       # {(symbolId, period, n): ProtoOAGetTrendbarsRes}
+
+    def delay(self):
+        return max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+
+    def trendbars(self, req):
+        minutes = PERIOD_MINUTES.get(_PERIOD_NAMES.get(req.period), 1)
+        n = int((req.toTimestamp - req.fromTimestamp) / 60_000 / minutes)
+        n = max(1, min(n, self.max_bars))
+        key = (req.symbolId, req.period, n)
+        if key not in self._bars:
+            res = synthetic_trendbars(
+                n, _PERIOD_NAMES[req.period],
+                start_price=self.prices.get(req.symbolId, 1.0), seed=self.seed + req.symbolId,
+            )
+            res.ctidTraderAccountId = req.ctidTraderAccountId
+            res.symbolId = req.symbolId
+            self._bars[key] = res
+        return self._bars[key]
+
+    def tick(self):
+        for sid in self.prices:
+            self.prices[sid] *= 1 + self.rng.gauss(0, 0.0002)
+
+    def new_order(self, req):
+        """Return the execution events a real server sends for a ProtoOANewOrderReq."""
+        account = req.ctidTraderAccountId
+        order_id = next(self._ids)
+        accepted = ProtoOAExecutionEvent(
+            ctidTraderAccountId=account, executionType=ProtoOAExecutionType.ORDER_ACCEPTED,
+        )
+        order = accepted.order
+        order.orderId = order_id
+        order.orderType = req.orderType
+        order.orderStatus = ProtoOAOrderStatus.ORDER_STATUS_ACCEPTED
+        order.tradeData.symbolId = req.symbolId
+        order.tradeData.volume = req.volume
+        order.tradeData.tradeSide = req.tradeSide
+        order.tradeData.openTimestamp = int(time.time() * 1000)
+        for field in ("limitPrice", "stopPrice", "stopLoss", "takeProfit",
+                      "relativeStopLoss", "relativeTakeProfit", "clientOrderId"):
+            if req.HasField(field):
+                setattr(order, field, getattr(req, field))
+
+        if req.orderType != ProtoOAOrderType.MARKET:
+            self.orders[order_id] = order
+            return [accepted]
+
+        filled = ProtoOAExecutionEvent(
+            ctidTraderAccountId=account, executionType=ProtoOAExecutionType.ORDER_FILLED,
+        )
+        filled.order.CopyFrom(order)
+        filled.order.orderStatus = ProtoOAOrderStatus.ORDER_STATUS_FILLED
+        filled.order.executionPrice = self.prices.get(req.symbolId, 1.0)
+        pos = filled.position
+        pos.positionId = next(self._ids)
+        pos.tradeData.CopyFrom(order.tradeData)
+        pos.positionStatus = ProtoOAPositionStatus.POSITION_STATUS_OPEN
+        pos.swap = 0
+        pos.price = filled.order.executionPrice
+        filled.order.positionId = pos.positionId
+        self.positions[pos.positionId] = pos
+        return [accepted, filled]
+
+    def amend_position(self, req):
+        pos = self.positions.get(req.positionId)
+        if pos is None:
+            return [self.error(req, "POSITION_NOT_FOUND")]
+        if req.HasField("stopLoss"):
+            pos.stopLoss = req.stopLoss
+        if req.HasField("takeProfit"):
+            pos.takeProfit = req.takeProfit
+        event = ProtoOAExecutionEvent(
+            ctidTraderAccountId=req.ctidTraderAccountId, executionType=ProtoOAExecutionType.ORDER_REPLACED,
+        )
+        event.position.CopyFrom(pos)
+        return [event]
+
+    def amend_order(self, req):
+        order = self.orders.get(req.orderId)
+        if order is None:
+            return [self.error(req, "ORDER_NOT_FOUND")]
+        for field in ("volume", "limitPrice", "stopPrice", "stopLoss", "takeProfit"):
+            if req.HasField(field):
+                value = getattr(req, field)
+                if field == "volume":
+                    order.tradeData.volume = value
+                else:
+                    setattr(order, field, value)
+        event = ProtoOAExecutionEvent(
+            ctidTraderAccountId=req.ctidTraderAccountId, executionType=ProtoOAExecutionType.ORDER_REPLACED,
+        )
+        event.order.CopyFrom(order)
+        return [event]
+
+    def reconcile(self, req):
+        res = ProtoOAReconcileRes(ctidTraderAccountId=req.ctidTraderAccountId)
+        res.position.extend(self.positions.values())
+        res.order.extend(self.orders.values())
+        return [res]
+
+    @staticmethod
+    def error(req, code, description=""):
+        return ProtoOAErrorRes(
+            ctidTraderAccountId=getattr(req, "ctidTraderAccountId", 0),
+            errorCode=code, description=description,
+        )
+
+    def handle(self, req):
+        """Return the list of payloads answering `req` (first one resolves the client Deferred)."""
+        name = type(req).__name__
+        if name == "ProtoOAApplicationAuthReq":
+            return [ProtoOAApplicationAuthRes()]
+        if name == "ProtoOAAccountAuthReq":
+            return [ProtoOAAccountAuthRes(ctidTraderAccountId=req.ctidTraderAccountId)]
+        if name == "ProtoOASymbolsListReq":
+            res = ProtoOASymbolsListRes(ctidTraderAccountId=req.ctidTraderAccountId)
+            for sid, symbol in self.symbols.items():
+                s = res.symbol.add()
+                s.symbolId, s.symbolName, s.enabled = sid, symbol, True
+            return [res]
+        if name == "ProtoOASymbolByIdReq":
+            return [symbol_details(req, self.symbols)]
+        if name == "ProtoOAGetTrendbarsReq":
+            return [self.trendbars(req)]
+        if name == "ProtoOAReconcileReq":
+            return self.reconcile(req)
+        if name == "ProtoOANewOrderReq":
+            return self.new_order(req)
+        if name == "ProtoOAAmendPositionSLTPReq":
+            return self.amend_position(req)
+        if name == "ProtoOAAmendOrderReq":
+            return self.amend_order(req)
+        if name == "ProtoOASubscribeSpotsReq":
+            return [ProtoOASubscribeSpotsRes(ctidTraderAccountId=req.ctidTraderAccountId)]
+        if name == "ProtoOAUnsubscribeSpotsReq":
+            return [ProtoOAUnsubscribeSpotsRes(ctidTraderAccountId=req.ctidTraderAccountId)]
+        return [self.error(req, "UNSUPPORTED_MESSAGE", f"simulator does not handle {name}")]
+
+
+class SimProtocol(Int32StringReceiver):
+    MAX_LENGTH = 15000000
+
+    def connectionMade(self):
+        self.broker = self.factory.broker
+        self.account_id = 0
+        self.spots = set()
+        self._spot_task = task.LoopingCall(self._send_spots)
+        self._spot_task.start(self.broker.spot_interval, now=False)
+
+    def connectionLost(self, reason):
+        if self._spot_task.running:
+            self._spot_task.stop()
+
+    def stringReceived(self, data):
+        msg = ProtoMessage()
+        msg.ParseFromString(data)
+        if msg.payloadType == _HEARTBEAT:
+            return
+        req = Protobuf.extract(msg)
+        self.account_id = getattr(req, "ctidTraderAccountId", self.account_id)
+
+        name = type(req).__name__
+        if name == "ProtoOASubscribeSpotsReq":
+            self.spots.update(req.symbolId)
+        elif name == "ProtoOAUnsubscribeSpotsReq":
+            self.spots.difference_update(req.symbolId)
+
+        responses = self.broker.handle(req)
+        reactor.callLater(self.broker.delay(), self._reply, responses, msg.clientMsgId or None)
+
+    def _reply(self, responses, client_msg_id):
+        if not self.connected:
+            return
+        for res in responses:
+            self.sendString(wrap(res, client_msg_id).SerializeToString())
+
+    def _send_spots(self):
+        self.broker.tick()
+        for sid in self.spots:
+            mid = self.broker.prices[sid]
+            event = ProtoOASpotEvent(
+                ctidTraderAccountId=self.account_id, symbolId=sid,
+                bid=int(round(mid * 0.99995 * 100_000)), ask=int(round(mid * 1.00005 * 100_000)),
+                timestamp=int(time.time() * 1000),
+            )
+            self.sendString(wrap(event).SerializeToString())
+
+
+class SimFactory(ServerFactory):
+    protocol = SimProtocol
+
+    def __init__(self, broker):
+        self.broker = broker
+
+
+def _self_signed_pem():
+    """Throwaway localhost key + certificate; the app's client does not verify the peer."""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.now(timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(days=1))
+        .not_valid_after(now + timedelta(days=365))
+        .sign(key, hashes.SHA256())
+    )
+    key_pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.TraditionalOpenSSL,
+        serialization.NoEncryption(),
+    )
+    return key_pem + cert.public_bytes(serialization.Encoding.PEM)
+
+
+def listen(broker, port=5035, interface="127.0.0.1"):
+    """Start serving `broker` over TLS on localhost."""
+    cert = ssl.PrivateCertificate.loadPEM(_self_signed_pem())
+    return reactor.listenSSL(port, SimFactory(broker), cert.options(), interface=interface)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local cTrader Open API simulator.")
+    parser.add_argument("--port", type=int, default=5035)
+    parser.add_argument("--symbols", nargs="+", default=list(DEFAULT_SYMBOLS))
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="± seconds of uniform latency noise")
+    parser.add_argument("--max-bars", type=int, default=100_000, help="cap on bars per trendbars response")
+    parser.add_argument("--spot-interval", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ollama-port", type=int, help="also serve a fake Ollama on this port")
+    parser.add_argument("--ollama-latency", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    broker = SimBroker(
+        symbols=args.symbols, max_bars=args.max_bars, latency=args.latency,
+        jitter=args.jitter, spot_interval=args.spot_interval, seed=args.seed,
+    )
+    listen(broker, args.port)
+    print(f"[INFO] cTrader simulator listening on 127.0.0.1:{args.port}")
+
+    if args.ollama_port:
+        ollama = FakeOllama(latency=args.ollama_latency, port=args.ollama_port).__enter__()
+        print(f"[INFO] fake Ollama at {ollama.url}")
+
+    reactor.run()
+
+
+if __name__ == "__main__":
+    main()
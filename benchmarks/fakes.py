@@ -0,0 +1,194 @@
+# fakes.py
+# ---------------------------------------------------------------------------
+# Offline stand-ins for the cTrader Open API client and the Ollama server,
+# plus synthetic / recorded trendbar fixtures for the benchmark suite.
+
+from ctrader_open_api import Protobuf
+from ctrader_open_api.messages.OpenApiCommonMessages_pb2 import ProtoMessage
+from ctrader_open_api.messages.OpenApiMessages_pb2 import (
+    ProtoOAApplicationAuthRes,
+    ProtoOAAccountAuthRes,
+    ProtoOASymbolsListRes,
+    ProtoOASymbolByIdRes,
+    ProtoOAGetTrendbarsRes,
+    ProtoOAReconcileRes,
+)
+from ctrader_open_api.messages.OpenApiModelMessages_pb2 import (
+    ProtoOALightSymbol,
+    ProtoOASymbol,
+    ProtoOATrendbarPeriod,
+)
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from twisted.internet import defer
+import numpy as np
+import json, threading, time
+
+
+PERIOD_MINUTES = {"M1": 1, "M5": 5, "M15": 15, "M30": 30, "H1": 60, "H4": 240, "D1": 1440}
+
+DEFAULT_SYMBOLS = ("EURUSD", "GBPUSD", "USDJPY", "XAUUSD")
+
+
+# ── trendbar fixtures ──────────────────────────────────────────────────────
+def synthetic_trendbars(n: int, tf: str = "M5", start_price: float = 1.1, seed: int = 0):
+    """Random-walk ProtoOAGetTrendbarsRes with `n` bars in cTrader's 1/100 000 int format."""
+    rng = np.random.default_rng(seed)
+    step = PERIOD_MINUTES[tf]
+
+    closes = int(start_price * 100_000) + np.cumsum(rng.integers(-30, 31, n))
+    opens = np.concatenate(([closes[0]], closes[:-1]))
+    lows = np.minimum(opens, closes) - rng.integers(0, 20, n)
+    highs = np.maximum(opens, closes) + rng.integers(0, 20, n)
+    volumes = rng.integers(50, 5_000, n)
+    start = int(time.time() // 60) - n * step
+
+    res = ProtoOAGetTrendbarsRes(
+        ctidTraderAccountId=0,
+        period=getattr(ProtoOATrendbarPeriod, tf),
+        timestamp=int(time.time() * 1000),
+    )
+    for i in range(n):
+        tb = res.trendbar.add()
+        tb.volume = int(volumes[i])
+        tb.low = int(lows[i])
+        tb.deltaOpen = int(opens[i] - lows[i])
+        tb.deltaHigh = int(highs[i] - lows[i])
+        tb.deltaClose = int(closes[i] - lows[i])
+        tb.utcTimestampInMinutes = start + i * step
+    return res
+
+
+def symbol_details(req, symbols):
+    """ProtoOASymbolByIdRes for the requested ids of {id: name}: 0.01-lot steps up to 1000 lots."""
+    res = ProtoOASymbolByIdRes(ctidTraderAccountId=req.ctidTraderAccountId)
+    for sid in req.symbolId:
+        if sid in symbols:
+            res.symbol.add().CopyFrom(ProtoOASymbol(
+                symbolId=sid, digits=5, pipPosition=4,
+                minVolume=100_000, stepVolume=100_000, maxVolume=10_000_000_000,
+            ))
+    return res
+
+
+def save_trendbars(message, path):
+    """Record a live trendbars response (ProtoMessage) to disk; usable as a Deferred callback."""
+    with open(path, "wb") as f:
+        f.write(Protobuf.extract(message).SerializeToString())
+    return message
+
+
+def load_trendbars(path):
+    res = ProtoOAGetTrendbarsRes()
+    with open(path, "rb") as f:
+        res.ParseFromString(f.read())
+    return res
+
+
+def wrap(payload, client_msg_id=None):
+    """Envelope a payload the same way it arrives from the wire."""
+    return ProtoMessage(
+        payloadType=payload.payloadType,
+        payload=payload.SerializeToString(),
+        clientMsgId=client_msg_id,
+    )
+
+
+# ── fake cTrader client ────────────────────────────────────────────────────
+class FakeClient:
+    """Answers the requests `ctrader_client` sends, synchronously and without a socket."""
+
+    def __init__(self, trendbars=None, symbols=DEFAULT_SYMBOLS):
+        self.trendbars = trendbars if trendbars is not None else synthetic_trendbars(1_000)
+        self.symbols = symbols
+        self.isConnected = False
+        self._trendbars_msg = None
+
+    @property
+    def connected(self):
+        return self.isConnected
+
+    def set_trendbars(self, trendbars):
+        self.trendbars = trendbars
+        self._trendbars_msg = None
+
+    def setConnectedCallback(self, callback):
+        self._connectedCallback = callback
+
+    def setDisconnectedCallback(self, callback):
+        self._disconnectedCallback = callback
+
+    def setMessageReceivedCallback(self, callback):
+        self._messageReceivedCallback = callback
+
+    def startService(self):
+        self.isConnected = True
+        if hasattr(self, "_connectedCallback"):
+            self._connectedCallback(self)
+
+    def send(self, message, clientMsgId=None, responseTimeoutInSeconds=5, **params):
+        name = type(message).__name__
+        if name == "ProtoOAGetTrendbarsReq":
+            # encode once per fixture so timings measure decoding, not the fake
+            if self._trendbars_msg is None:
+                self._trendbars_msg = wrap(self.trendbars, clientMsgId)
+            return defer.succeed(self._trendbars_msg)
+        if name == "ProtoOAApplicationAuthReq":
+            res = ProtoOAApplicationAuthRes()
+        elif name == "ProtoOAAccountAuthReq":
+            res = ProtoOAAccountAuthRes(ctidTraderAccountId=message.ctidTraderAccountId)
+        elif name == "ProtoOASymbolsListReq":
+            res = ProtoOASymbolsListRes(ctidTraderAccountId=message.ctidTraderAccountId)
+            for i, s in enumerate(self.symbols, start=1):
+                res.symbol.add().CopyFrom(ProtoOALightSymbol(symbolId=i, symbolName=s, enabled=True))
+        elif name == "ProtoOASymbolByIdReq":
+            res = symbol_details(message, dict(enumerate(self.symbols, start=1)))
+        elif name == "ProtoOAReconcileReq":
+            res = ProtoOAReconcileRes(ctidTraderAccountId=message.ctidTraderAccountId)
+        else:
+            return defer.fail(NotImplementedError(f"FakeClient cannot answer {name}"))
+        return defer.succeed(wrap(res, clientMsgId))
+
+
+# ── fake Ollama server ─────────────────────────────────────────────────────
+class FakeOllama:
+    """Localhost /api/generate endpoint returning a canned decision after `latency` seconds."""
+
+    def __init__(self, decision=None, latency: float = 0.0, port: int = 0):
+        self.decision = decision or {
+            "signal": "no_trade", "sl": None, "tp": None,
+            "confidence": 0.5, "explanation": "benchmark stub",
+        }
+        self.latency = latency
+        self.port = port
+        self.server = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}/api/generate"
+
+    def __enter__(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if fake.latency:
+                    time.sleep(fake.latency)
+                body = json.dumps({"response": json.dumps(fake.decision), "done": True}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,112 @@
+# load.py
+# ---------------------------------------------------------------------------
+# Concurrent load driver for a running app (usually wired to ctrader_sim.py).
+#
+#   python -m benchmarks.load --url http://localhost:4000 --concurrency 32 \
+#       --requests 500 --mix candles=8 analyze=1 execute_trade=1
+
+import argparse, itertools, json, random, statistics, sys, time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+
+def _candles(session, url, symbol, timeframe, timeout):
+    return session.get(f"{url}/api/candles", timeout=timeout,
+                       params={"symbol": symbol, "timeframe": timeframe, "num_bars": 5000})
+
+
+def _analyze(session, url, symbol, timeframe, timeout):
+    return session.post(f"{url}/api/analyze", timeout=timeout,
+                        json={"symbol": symbol, "timeframe": timeframe, "indicators": []})
+
+
+def _execute_trade(session, url, symbol, timeframe, timeout):
+    return session.post(f"{url}/api/execute_trade", timeout=timeout, json={
+        "symbol": symbol, "action": random.choice(["BUY", "SELL"]),
+        "order_type": "MARKET", "volume": 0.01,
+    })
+
+
+SCENARIOS = {"candles": _candles, "analyze": _analyze, "execute_trade": _execute_trade}
+
+
+def percentile(samples, q):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def run(url, mix, total, concurrency, symbols, timeframe, timeout):
+    weighted = list(itertools.chain.from_iterable([name] * w for name, w in mix.items()))
+    plan = [random.choice(weighted) for _ in range(total)]
+    latencies, errors = defaultdict(list), defaultdict(int)
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+
+    def one(name):
+        t0 = time.perf_counter()
+        try:
+            r = SCENARIOS[name](session, url, random.choice(symbols), timeframe, timeout)
+            ok = r.status_code < 400
+        except requests.RequestException:
+            ok = False
+        return name, time.perf_counter() - t0, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for name, elapsed, ok in pool.map(one, plan):
+            latencies[name].append(elapsed)
+            if not ok:
+                errors[name] += 1
+    wall = time.perf_counter() - started
+
+    report = {"wall_seconds": wall, "throughput_rps": total / wall, "endpoints": {}}
+    for name, samples in latencies.items():
+        report["endpoints"][name] = {
+            "count": len(samples),
+            "errors": errors[name],
+            "p50": percentile(samples, 50),
+            "p90": percentile(samples, 90),
+            "p99": percentile(samples, 99),
+            "max": max(samples),
+            "mean": statistics.fmean(samples),
+        }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive concurrent API load and report tail latency.")
+    parser.add_argument("--url", default="http://localhost:4000")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mix", nargs="+", default=["candles=1"], help="scenario=weight, e.g. candles=8 analyze=1")
+    parser.add_argument("--symbols", nargs="+", default=["EURUSD", "GBPUSD", "USDJPY"])
+    parser.add_argument("--timeframe", default="M5")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args(argv)
+
+    mix = {}
+    for item in args.mix:
+        name, _, weight = item.partition("=")
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario '{name}' (choose from {', '.join(SCENARIOS)})")
+        mix[name] = int(weight or 1)
+
+    report = run(args.url, mix, args.requests, args.concurrency, args.symbols, args.timeframe, args.timeout)
+
+    print(f"{args.requests} requests in {report['wall_seconds']:.2f}s → {report['throughput_rps']:.1f} req/s")
+    for name, s in report["endpoints"].items():
+        print(f"{name:<14} n={s['count']:<5} err={s['errors']:<4} p50 {s['p50'] * 1000:8.1f} ms  "
+              f"p90 {s['p90'] * 1000:8.1f} ms  p99 {s['p99'] * 1000:8.1f} ms  max {s['max'] * 1000:8.1f} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+# run.py
+# ---------------------------------------------------------------------------
+# Benchmark suite for the data, feature, serialization and analysis hot paths.
+#
+# Run from the repository root (app.py resolves static/ and templates/ there):
+#
+#   python -m benchmarks.run --output bench.json
+#   python -m benchmarks.run --sizes 1000 10000 --only smc_ --compare bench.json
+#   python -m benchmarks.run --fixture recorded_eurusd_m5.pb
+
+import os
+
+# ctrader_client reads its credentials at import time; the fakes never use them
+os.environ.setdefault("CTRADER_ACCOUNT_ID", "0")
+os.environ.setdefault("CTRADER_HOST_TYPE", "demo")
+# time the broker decode path, not the gateway's bar cache
+os.environ.setdefault("BROKER_BAR_CACHE_TTL", "0")
+
+import argparse, asyncio, json, platform, statistics, sys, time
+from datetime import datetime, timezone
+
+from benchmarks.fakes import FakeClient, FakeOllama, load_trendbars, synthetic_trendbars, wrap
+import backend.ctrader_client as ctrader_client
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 500_000]
+INDICATORS = ["SMA (20)", "EMA (20)", "Bollinger Bands"]
+SYMBOL, TIMEFRAME = "EURUSD", "M5"
+
+BENCHMARKS = {}   # {name: (setup(n) -> callable, max_bars)}
+
+
+def benchmark(name, max_bars=None):
+    """Register `setup(n)`; it prepares state for n bars and returns the callable to time."""
+    def deco(setup):
+        BENCHMARKS[name] = (setup, max_bars)
+        return setup
+    return deco
+
+
+class _JsonRequest:
+    """Just enough of starlette's Request for the /api/analyze handler."""
+    def __init__(self, body):
+        self._body = body
+
+    async def json(self):
+        return self._body
+
+
+# ── environment ────────────────────────────────────────────────────────────
+fake_client = FakeClient()
+ctrader_client.client = fake_client
+ctrader_client.connected(None)   # auth → symbol list against the fake
+
+# app.py calls broker.start() on import; against the synchronous fake that would only
+# re-run auth and leave a live reactor thread running through every timing
+from backend import broker
+broker.start = lambda: None
+
+from backend import app as app_module, llm_analyzer
+from backend.data_fetcher import fetch_data
+from backend.indicators import add_indicators
+from backend import smc_features
+from backend.bar_store import BarRing, records_from_bars, to_frame
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+_fixtures = {}
+_rings = []   # shared-memory segments created by the bar_store benchmarks
+_recorded = None
+
+
+def use_bars(n):
+    """Point the fake client at an n-bar fixture and return the response payload."""
+    if _recorded is not None:
+        res = type(_recorded)()
+        res.CopyFrom(_recorded)
+        del res.trendbar[n:]
+    else:
+        if n not in _fixtures:
+            _fixtures[n] = synthetic_trendbars(n, TIMEFRAME)
+        res = _fixtures[n]
+    fake_client.set_trendbars(res)
+    return res
+
+
+def frame(n):
+    use_bars(n)
+    df, _ = fetch_data(SYMBOL, TIMEFRAME, n)
+    # fetch_data turns any error into an empty frame; never time that as a fast no-op
+    if df.empty:
+        raise RuntimeError("fetch_data returned no bars (see the error printed above)")
+    return df
+
+
+# ── benchmarks ─────────────────────────────────────────────────────────────
+@benchmark("trendbars_cb")
+def _(n):
+    msg = wrap(use_bars(n))
+    return lambda: ctrader_client._trendbars_cb(msg)
+
+
+@benchmark("fetch_data")
+def _(n):
+    frame(n)   # fails the benchmark if the fetch is broken
+    return lambda: fetch_data(SYMBOL, TIMEFRAME, n)
+
+
+@benchmark("add_indicators")
+def _(n):
+    df = frame(n)
+    return lambda: add_indicators(df.copy(), INDICATORS)
+
+
+for _fn in ("detect_bos_choch", "in_premium_discount", "current_fvg",
+            "ob_near_price", "trend_strength", "build_feature_snapshot"):
+    def _setup(n, fn=getattr(smc_features, _fn)):
+        df = frame(n)
+        return lambda: fn(df)
+    benchmark(f"smc_{_fn}")(_setup)
+
+
+@benchmark("bar_store_publish")
+def _(n):
+    use_bars(n)
+    bars = ctrader_client.get_ohlc_data(SYMBOL, TIMEFRAME, n)
+    ring = BarRing.create(f"BENCH{n}", TIMEFRAME, capacity=n)
+    _rings.append(ring)
+    return lambda: ring.replace(records_from_bars(bars))
+
+
+@benchmark("bar_store_read")
+def _(n):
+    use_bars(n)
+    records = records_from_bars(ctrader_client.get_ohlc_data(SYMBOL, TIMEFRAME, n))
+    ring = BarRing.create(f"BENCH{n}R", TIMEFRAME, capacity=n)
+    ring.replace(records)
+    _rings.append(ring)
+    reader = BarRing.attach(f"BENCH{n}R", TIMEFRAME)
+    _rings.append(reader)
+    return lambda: to_frame(reader.read())
+
+
+@benchmark("candles_endpoint")
+def _(n):
+    use_bars(n)
+
+    def run():
+        body = asyncio.run(app_module.get_candles(
+            symbol=SYMBOL, timeframe=TIMEFRAME, indicators=INDICATORS, num_bars=n,
+        ))
+        return JSONResponse(jsonable_encoder(body)).body
+    return run
+
+
+@benchmark("chart_render", max_bars=10_000)
+def _(n):
+    df = frame(n)
+
+    def run():
+        fig = app_module.build_analysis_figure(df)
+        fig.update_layout(width=800, height=400)
+        return fig.to_image(format="png")
+    return run
+
+
+@benchmark("analyze_endpoint", max_bars=10_000)
+def _(n):
+    use_bars(n)
+    req = _JsonRequest({"symbol": SYMBOL, "timeframe": TIMEFRAME, "indicators": INDICATORS})
+    return lambda: asyncio.run(app_module.analyze(req))
+
+
+# ── runner ─────────────────────────────────────────────────────────────────
+def time_call(fn, repeat):
+    fn()   # warm-up (imports, kaleido start-up, caches)
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return {
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.fmean(samples),
+        "repeat": repeat,
+    }
+
+
+def run_suite(sizes, only=None, repeat=5):
+    results = {}
+    for name, (setup, max_bars) in BENCHMARKS.items():
+        if only and not any(name.startswith(o) for o in only):
+            continue
+        results[name] = {}
+        for n in sizes:
+            if max_bars and n > max_bars:
+                continue
+            try:
+                stats = time_call(setup(n), repeat)
+            except Exception as e:
+                msg = (str(e).strip().splitlines() or [type(e).__name__])[0]
+                print(f"[ERROR] {name} @ {n}: {msg}")
+                results[name][str(n)] = {"error": msg}
+                continue
+            results[name][str(n)] = stats
+            print(f"{name:<32} {n:>8} bars  median {stats['median'] * 1000:10.2f} ms  "
+                  f"min {stats['min'] * 1000:10.2f} ms")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print median regressions beyond `threshold` (0.2 = 20 %); return how many were found."""
+    regressions = 0
+    for name, by_size in results.items():
+        for n, stats in by_size.items():
+            base = baseline.get(name, {}).get(n)
+            if not base or "median" not in base or "median" not in stats:
+                continue
+            ratio = stats["median"] / base["median"]
+            if ratio > 1 + threshold:
+                regressions += 1
+                print(f"[REGRESSION] {name} @ {n} bars: {ratio:.2f}x slower "
+                      f"({base['median'] * 1000:.2f} → {stats['median'] * 1000:.2f} ms)")
+    return regressions
+
+
+def main(argv=None):
+    global _recorded
+    parser = argparse.ArgumentParser(description="Benchmark the data, feature, serialization and analysis hot paths.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--only", nargs="+", help="benchmark name prefixes to run")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--fixture", help="recorded ProtoOAGetTrendbarsRes (see fakes.save_trendbars)")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON from a previous --output run")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    if args.fixture:
+        _recorded = load_trendbars(args.fixture)
+
+    try:
+        with FakeOllama() as ollama:
+            llm_analyzer.OLLAMA_URL = ollama.url
+            results = run_suite(args.sizes, args.only, args.repeat)
+    finally:
+        for ring in reversed(_rings):
+            ring.close()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "meta": {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                    "fixture": args.fixture or "synthetic",
+                },
+                "results": results,
+            }, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
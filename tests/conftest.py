@@ -0,0 +1,8 @@
+# conftest.py
+# ---------------------------------------------------------------------------
+# ctrader_client reads its settings at import time; nothing here connects.
+
+import os
+
+os.environ.setdefault("CTRADER_ACCOUNT_ID", "1")
+os.environ.setdefault("CTRADER_HOST_TYPE", "demo")
@@ -0,0 +1,159 @@
+# test_bar_store.py
+# ---------------------------------------------------------------------------
+
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing, os
+import numpy as np
+import pytest
+
+from backend import bar_store
+from backend.bar_store import BAR_DTYPE, BarRing
+
+
+@pytest.fixture(autouse=True)
+def isolated_store(monkeypatch):
+    monkeypatch.setattr(bar_store, "PREFIX", f"smctest{os.getpid()}")
+    yield
+    bar_store._close_all()
+
+
+@pytest.fixture
+def create():
+    """BarRing.create that closes (and unlinks) every segment after the test."""
+    rings = []
+
+    def factory(symbol, tf, capacity):
+        rings.append(BarRing.create(symbol, tf, capacity=capacity))
+        return rings[-1]
+
+    yield factory
+    for ring in rings:
+        if ring._header is not None:
+            ring.close()
+
+
+def records(start, n):
+    out = np.zeros(n, dtype=BAR_DTYPE)
+    out["time"] = np.arange(start, start + n) * 60
+    out["close"] = np.arange(start, start + n, dtype=float)
+    return out
+
+
+def bars(start, n):
+    return [
+        dict(time=f"2024-01-01T00:{i:02d}:00+00:00", open=i, high=i + 1, low=i - 1, close=i + 0.5, volume=10)
+        for i in range(start, start + n)
+    ]
+
+
+def test_records_round_trip_through_frame():
+    frame = bar_store.to_frame(bar_store.records_from_bars(bars(0, 3)))
+    assert list(frame.columns) == ["open", "high", "low", "close", "volume"]
+    assert frame.index[1].isoformat() == "2024-01-01T00:01:00+00:00"
+    assert frame["close"].tolist() == [0.5, 1.5, 2.5]
+
+
+def test_replace_keeps_newest_capacity_records(create):
+    ring = create("EURUSD", "M1", capacity=4)
+    ring.replace(records(0, 10))
+    assert len(ring) == 4
+    assert ring.read()["close"].tolist() == [6, 7, 8, 9]
+    assert ring.read(2)["close"].tolist() == [8, 9]
+
+
+def test_append_wraps_around_oldest_first(create):
+    ring = create("EURUSD", "M1", capacity=5)
+    ring.append(records(0, 3))
+    assert ring.view()["close"].tolist() == [0, 1, 2]
+
+    ring.append(records(3, 4))   # wraps: 7 records into 5 slots
+    assert len(ring) == 5
+    assert ring.view()["close"].tolist() == [2, 3, 4, 5, 6]
+    assert ring.read(3)["close"].tolist() == [4, 5, 6]
+
+    ring.append(records(7, 12))  # more than capacity in one call
+    assert ring.read()["close"].tolist() == [14, 15, 16, 17, 18]
+
+
+def test_view_is_zero_copy_unless_wrapped(create):
+    ring = create("EURUSD", "M1", capacity=5)
+    ring.append(records(0, 4))
+    assert np.shares_memory(ring.view(), ring._data)
+    ring.append(records(4, 3))
+    assert not np.shares_memory(ring.view(), ring._data)   # wrapped range is concatenated
+    assert np.shares_memory(ring.view(2), ring._data)      # newest two are contiguous
+
+
+def test_read_copy_is_detached_from_later_writes(create):
+    ring = create("EURUSD", "M1", capacity=3)
+    ring.replace(records(0, 3))
+    snapshot = ring.read()
+    ring.replace(records(10, 3))
+    assert snapshot["close"].tolist() == [0, 1, 2]
+
+
+def test_read_times_out_while_writer_is_mid_update(create):
+    ring = create("EURUSD", "M1", capacity=3)
+    ring.replace(records(0, 3))
+    ring._begin()   # writer died before _commit
+    with pytest.raises(TimeoutError):
+        ring.read(timeout=0.05)
+    ring._commit(0, 3)
+    assert len(ring.read()) == 3
+
+
+def test_publish_and_load_from_another_attachment(monkeypatch):
+    monkeypatch.setattr(bar_store, "CAPACITY", 10)
+    bar_store.publish("eurusd", "M1", bars(0, 4))
+    assert bar_store.load_records("EURUSD", "M1", n=2)["close"].tolist() == [2.5, 3.5]
+    assert bar_store.load_frame("EURUSD", "M1")["open"].tolist() == [0, 1, 2, 3]
+    live = bar_store.load_records("EURUSD", "M1", copy=False)
+    assert not live.flags.owndata
+
+
+def _read_in_child(prefix, symbol, tf):
+    bar_store.PREFIX = prefix
+    return bar_store.load_records(symbol, tf)["close"].tolist()
+
+
+def test_other_process_reads_published_bars(monkeypatch):
+    monkeypatch.setattr(bar_store, "CAPACITY", 10)
+    bar_store.publish("EURUSD", "M1", bars(0, 3))
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        closes = pool.submit(_read_in_child, bar_store.PREFIX, "EURUSD", "M1").result(timeout=60)
+    assert closes == [0.5, 1.5, 2.5]
+    # the reader exiting must not unlink the writer's segment
+    assert bar_store.load_records("EURUSD", "M1", n=1)["close"].tolist() == [2.5]
+
+
+def test_publish_is_disabled_without_capacity(monkeypatch):
+    monkeypatch.setattr(bar_store, "CAPACITY", 0)
+    bar_store.publish("EURUSD", "M1", bars(0, 4))
+    with pytest.raises(FileNotFoundError):
+        bar_store.load_records("EURUSD", "M1")
+
+
+def test_reader_reattaches_after_writer_recreates_segment(create):
+    first = create("EURUSD", "M1", capacity=5)
+    first.replace(records(0, 2))
+    assert bar_store.load_records("EURUSD", "M1")["close"].tolist() == [0, 1]
+    reader = bar_store._readers[("EURUSD", "M1")]
+
+    # gateway restart: a new writer replaces the segment under the same name
+    second = create("EURUSD", "M1", capacity=5)
+    second.replace(records(10, 3))
+    assert reader.stale
+    assert bar_store.load_records("EURUSD", "M1")["close"].tolist() == [10, 11, 12]
+
+    first.close()   # must not unlink the newer segment
+    assert bar_store.load_records("EURUSD", "M1")["close"].tolist() == [10, 11, 12]
+
+
+def test_reader_notices_writer_shutdown(create):
+    writer = create("EURUSD", "M1", capacity=5)
+    writer.replace(records(0, 2))
+    bar_store.load_records("EURUSD", "M1")
+    writer.close()
+    assert bar_store._readers[("EURUSD", "M1")].stale
+    with pytest.raises(FileNotFoundError):
+        bar_store.load_records("EURUSD", "M1")
@@ -0,0 +1,131 @@
+# test_llm_analyzer.py
+# ---------------------------------------------------------------------------
+# Parsing, validation and the one-shot repair flow; Ollama and Kaleido are faked.
+
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend import llm_analyzer
+from backend.llm_analyzer import _decision_from_content, _extract_json
+
+PRICE = 1.10
+LONG = '{"signal": "long", "sl": 1.05, "tp": 1.20, "confidence": 0.8, "explanation": "BOS up"}'
+
+
+@pytest.mark.parametrize("content, expected", [
+    (LONG, {"signal": "long", "sl": 1.05}),
+    ("```json\n" + LONG + "\n```", {"signal": "long", "sl": 1.05}),
+    (LONG + "\nExplanation: price swept liquidity.", {"signal": "long"}),
+    ("Here is my {analysis}: " + LONG, {"signal": "long"}),
+    ('{"signal": "short", "sl": "1.15", "tp": "1.02"} {"signal": "long"}', {"signal": "short"}),
+    ("no json at all", None),
+    ('{"signal": "long", "sl": 1.05', None),
+])
+def test_extract_json(content, expected):
+    obj, _ = _extract_json(content)
+    if expected is None:
+        assert obj is None
+    else:
+        assert expected.items() <= obj.items()
+
+
+def test_extract_json_returns_trailing_text():
+    _, trailing = _extract_json(LONG + "\nExplanation: price swept liquidity.")
+    assert trailing.strip() == "Explanation: price swept liquidity."
+
+
+@pytest.mark.parametrize("content, signal, sl, tp, problems", [
+    # fenced, valid
+    ("```json\n" + LONG + "\n```", "long", 1.05, 1.20, []),
+    # string numbers and upper-case signal are normalised
+    ('{"signal": "SHORT", "sl": "1.15", "tp": "1.02", "confidence": "0.6", "explanation": "x"}',
+     "short", 1.15, 1.02, []),
+    ('{"signal": "no_trade", "sl": null, "tp": null, "confidence": 0, "explanation": "range"}',
+     "no_trade", None, None, []),
+    # SL/TP on the wrong side of the price
+    ('{"signal": "long", "sl": 1.15, "tp": 1.20}', "long", 1.15, 1.20, ["long needs"]),
+    ('{"signal": "long", "sl": 1.05, "tp": 1.08}', "long", 1.05, 1.08, ["long needs"]),
+    ('{"signal": "short", "sl": 1.05, "tp": 1.02}', "short", 1.05, 1.02, ["short needs"]),
+    ('{"signal": "short", "sl": 1.15, "tp": 1.12}', "short", 1.15, 1.12, ["short needs"]),
+    # missing / unparseable levels and unknown signals
+    ('{"signal": "long", "sl": "n/a", "tp": 1.20}', "long", None, 1.20, ["sl and tp are required"]),
+    ('{"signal": "buy", "sl": 1.05, "tp": 1.20}', "buy", 1.05, 1.20, ["unknown signal"]),
+])
+def test_decision_from_content(content, signal, sl, tp, problems):
+    td, errors = _decision_from_content(content, PRICE)
+    assert (td.signal, td.sl, td.tp) == (signal, sl, tp)
+    assert len(errors) == len(problems)
+    for error, problem in zip(errors, problems):
+        assert problem in error
+
+
+def test_decision_without_json():
+    td, errors = _decision_from_content("I think it goes up.", PRICE)
+    assert td is None and errors == ["no JSON object found in LLM response"]
+
+
+def test_explanation_falls_back_to_trailing_text():
+    td, _ = _decision_from_content('{"signal": "no_trade"}\nExplanation: choppy range', PRICE)
+    assert td.reasons == ["choppy range"]
+
+
+# ── repair flow ────────────────────────────────────────────────────────────
+class FakeFigure:
+    def update_layout(self, **kwargs):
+        pass
+
+    def write_image(self, path):
+        with open(path, "wb") as f:
+            f.write(b"\x89PNG")
+
+
+def ohlc(n=120, last=PRICE):
+    close = np.linspace(last - 0.05, last, n)
+    return pd.DataFrame({"open": close - 0.001, "high": close + 0.002, "low": close - 0.002,
+                         "close": close, "volume": 100.0},
+                        index=pd.date_range("2024-01-01", periods=n, freq="h", tz="UTC"))
+
+
+@pytest.fixture
+def ollama(monkeypatch):
+    """Scripted replies for _ollama_generate; records the prompts it was given."""
+    calls = []
+
+    def script(*replies):
+        def generate(prompt, images=None):
+            calls.append((prompt, images))
+            return replies[len(calls) - 1]
+        monkeypatch.setattr(llm_analyzer, "_ollama_generate", generate)
+        return calls
+    return script
+
+
+def analyze():
+    return asyncio.run(llm_analyzer.analyze_chart_with_llm(FakeFigure(), ohlc(), "EURUSD", "H1"))
+
+
+def test_valid_first_answer_needs_no_repair(ollama):
+    calls = ollama(LONG)
+    decision = analyze()
+    assert decision.signal == "long" and len(calls) == 1
+    assert calls[0][1]   # the chart image went with the first prompt
+
+
+def test_repair_fixes_wrong_side_levels(ollama):
+    calls = ollama('{"signal": "long", "sl": 1.15, "tp": 1.20}', LONG)
+    decision = analyze()
+    assert (decision.signal, decision.sl, decision.tp) == ("long", 1.05, 1.20)
+    assert len(calls) == 2
+    repair_prompt, images = calls[1]
+    assert images is None and "long needs" in repair_prompt
+
+
+def test_failed_repair_falls_back_to_no_trade(ollama):
+    calls = ollama('{"signal": "short", "sl": 1.05, "tp": 1.02}', "still not json")
+    decision = analyze()
+    assert decision.signal == "no_trade" and decision.sl is None
+    assert "no JSON object found" in decision.reasons[0]
+    assert len(calls) == 2   # exactly one retry
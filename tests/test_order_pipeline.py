@@ -0,0 +1,217 @@
+# test_order_pipeline.py
+# ---------------------------------------------------------------------------
+# Intent state machine, driven by the execution events benchmarks/ctrader_sim.py
+# produces for each request. Nothing here touches the network or the reactor.
+
+from types import SimpleNamespace
+import time
+
+import pytest
+from twisted.internet import defer
+from ctrader_open_api.messages.OpenApiMessages_pb2 import ProtoOAAmendPositionSLTPReq
+
+from backend import ctrader_client, order_pipeline
+from benchmarks.ctrader_sim import SimBroker
+from benchmarks.fakes import wrap
+
+
+class FakeReactor:
+    def __init__(self):
+        self.later = []
+
+    def callFromThread(self, fn, *args):
+        fn(*args)
+
+    def callLater(self, delay, fn, *args):
+        self.later.append((delay, fn, args))
+
+    def run_later(self):
+        later, self.later = self.later, []
+        for _, fn, args in later:
+            fn(*args)
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    sent = []   # [(request, clientMsgId, Deferred)]
+
+    def send(req, clientMsgId=None, responseTimeoutInSeconds=5):
+        d = defer.Deferred()
+        sent.append((req, clientMsgId, d))
+        return d
+
+    monkeypatch.setattr(ctrader_client.client, "send", send)
+    monkeypatch.setattr(ctrader_client, "symbol_name_to_id", {"EURUSD": 1, "GBPUSD": 2})
+    # EURUSD: 0.01 to 1000 lots in 0.01 steps; GBPUSD limits not loaded
+    monkeypatch.setattr(ctrader_client, "symbol_volume_map", {1: (100_000, 100_000, 10_000_000_000)})
+    monkeypatch.setattr(order_pipeline, "_intents", {})
+    reactor = FakeReactor()
+    monkeypatch.setattr(order_pipeline, "reactor", reactor)
+    return SimpleNamespace(sim=SimBroker(symbols=("EURUSD", "GBPUSD")), sent=sent, reactor=reactor)
+
+
+def deliver(broker, index=-1, events=slice(None)):
+    """Feed the simulator's answer to the `index`-th sent request back as broker events."""
+    req, key, _ = broker.sent[index]
+    for payload in broker.sim.handle(req)[events]:
+        order_pipeline.on_message(None, wrap(payload, key))
+
+
+def status(client_msg_id):
+    return order_pipeline.get_status([client_msg_id])[0]
+
+
+def submit(**intent):
+    intent.setdefault("symbol", "EURUSD")
+    intent.setdefault("direction", "BUY")
+    return order_pipeline.submit_intents([intent])[0]
+
+
+def test_market_order_is_accepted_then_filled(broker):
+    ack = submit(client_msg_id="m1")
+    assert ack["status"] == "queued" and not ack["done"]
+    assert status("m1")["status"] == "sent"
+
+    deliver(broker, events=slice(0, 1))   # ORDER_ACCEPTED only
+    assert status("m1")["status"] == "accepted" and not status("m1")["done"]
+
+    deliver(broker, events=slice(1, 2))   # ORDER_FILLED
+    record = status("m1")
+    assert record["status"] == "filled" and record["done"]
+    assert record["order_id"] and record["position_id"]
+    assert len(broker.sent) == 1          # no SL/TP, no amend
+
+
+def test_pending_order_is_final_once_accepted(broker):
+    submit(client_msg_id="l1", order_type="LIMIT", entry_price=1.0, stop_loss=0.9)
+    req = broker.sent[0][0]
+    assert req.limitPrice == 1.0 and req.stopLoss == 0.9   # SL/TP ride on the order itself
+    deliver(broker)
+    assert status("l1")["status"] == "accepted" and status("l1")["done"]
+
+
+def test_fill_amends_sltp_with_absolute_prices(broker):
+    submit(client_msg_id="s1", stop_loss=1.05, take_profit=1.2)
+    deliver(broker)
+    assert status("s1")["status"] == "amending" and not status("s1")["done"]
+
+    amend, key, _ = broker.sent[-1]
+    assert isinstance(amend, ProtoOAAmendPositionSLTPReq) and key == "s1:sltp"
+    assert (amend.stopLoss, amend.takeProfit) == (1.05, 1.2)
+    assert amend.positionId == status("s1")["position_id"]
+
+    deliver(broker)   # ORDER_REPLACED
+    record = status("s1")
+    assert record["status"] == "filled" and record["done"] and record["sltp_set"]
+    assert record["sltp_error"] is None
+
+
+def test_amend_error_keeps_order_filled(broker):
+    submit(client_msg_id="s2", take_profit=1.2)
+    deliver(broker)
+    broker.sim.positions.clear()   # broker answers the amend with POSITION_NOT_FOUND
+    deliver(broker)
+    record = status("s2")
+    assert record["status"] == "filled" and record["done"]
+    assert "POSITION_NOT_FOUND" in record["sltp_error"] and record["sltp_set"] is False
+    assert record["error_code"] is None
+
+
+def test_amend_timeout_keeps_order_filled(broker):
+    submit(client_msg_id="s3", stop_loss=1.05)
+    deliver(broker)
+    broker.sent[-1][2].errback(defer.TimeoutError())   # no answer to the amend
+    record = status("s3")
+    assert record["status"] == "filled" and record["done"]
+    assert record["sltp_error"] and record["sltp_set"] is False
+
+
+def test_unanswered_order_times_out(broker):
+    submit(client_msg_id="t1")
+    broker.sent[0][2].errback(defer.TimeoutError())
+    record = status("t1")
+    assert record["status"] == "timeout" and record["error_code"] == "TIMEOUT"
+
+
+def test_deadline_finishes_accepted_order_without_fill(broker):
+    submit(client_msg_id="d1")
+    deliver(broker, events=slice(0, 1))
+    delay = broker.reactor.later[0][0]
+    assert order_pipeline.ORDER_DEADLINE - 1 < delay <= order_pipeline.ORDER_DEADLINE
+    assert status("d1")["deadline"] == pytest.approx(time.time() + delay, abs=1)
+
+    broker.reactor.run_later()
+    assert status("d1")["status"] == "timeout" and status("d1")["done"]
+
+    deliver(broker, events=slice(0, 1))   # a late ORDER_ACCEPTED must not reopen it
+    assert status("d1")["done"]
+
+
+def test_deadline_during_amend_reports_filled(broker):
+    submit(client_msg_id="d2", stop_loss=1.05)
+    deliver(broker)
+    broker.reactor.run_later()
+    record = status("d2")
+    assert record["status"] == "filled" and record["sltp_error"]
+
+
+def test_duplicate_id_is_not_sent_twice(broker):
+    submit(client_msg_id="x1")
+    ack = submit(client_msg_id="x1")
+    assert ack["duplicate"] and ack["status"] == "sent"
+    assert len(broker.sent) == 1
+
+
+def test_rejected_intent_can_be_retried_under_the_same_id(broker, monkeypatch):
+    monkeypatch.setattr(ctrader_client, "symbol_name_to_id", {})
+    ack = submit(client_msg_id="r1")
+    assert ack["error_code"] == "SYMBOLS_NOT_LOADED" and ack["done"]
+    assert status("r1")["status"] == "unknown"
+
+    monkeypatch.setattr(ctrader_client, "symbol_name_to_id", {"EURUSD": 1})
+    ack = submit(client_msg_id="r1")
+    assert "duplicate" not in ack and status("r1")["status"] == "sent"
+    assert len(broker.sent) == 1
+
+
+@pytest.mark.parametrize("intent, code", [
+    (dict(symbol="NOPE"), "UNKNOWN_SYMBOL"),
+    (dict(direction="HOLD"), "INVALID_INTENT"),
+    (dict(volume=0), "INVALID_INTENT"),
+    (dict(volume=0.005), "INVALID_VOLUME"),
+    (dict(volume=0.123), "INVALID_VOLUME"),
+    (dict(volume=1001), "INVALID_VOLUME"),
+    (dict(order_type="LIMIT"), "INVALID_INTENT"),
+    (dict(order_type="LIMIT", entry_price=1.0, stop_loss=1.1), "INVALID_INTENT"),
+    (dict(direction="SELL", order_type="STOP", entry_price=1.0, take_profit=1.1), "INVALID_INTENT"),
+])
+def test_invalid_intents_are_rejected_before_sending(broker, intent, code):
+    ack = submit(**intent)
+    assert ack["status"] == "rejected" and ack["error_code"] == code
+    assert not broker.sent
+
+
+def test_volume_is_rounded_to_units(broker):
+    submit(client_msg_id="v1", volume=0.29)    # 0.29 * 10_000_000 == 2899999.9999999995
+    submit(client_msg_id="v2", symbol="GBPUSD", volume=0.123)   # no limits known: broker decides
+    assert [req.volume for req, _, _ in broker.sent] == [2_900_000, 1_230_000]
+
+
+def test_eviction_skips_unfinished_and_drops_oldest_finished(broker, monkeypatch):
+    monkeypatch.setattr(order_pipeline, "MAX_TRACKED", 4)
+    submit(client_msg_id="open")          # stays in flight, inserted first
+    for cid in ("a", "b", "c"):
+        submit(client_msg_id=cid)
+        deliver(broker)
+    order_pipeline._intents["b"]["updated"] -= 10   # least recently updated
+
+    submit(client_msg_id="new")   # five tracked: one finished intent must go
+    assert set(order_pipeline._intents) == {"open", "a", "c", "new"}
+
+
+def test_eviction_drops_finished_intents_past_retention(broker):
+    submit(client_msg_id="old")
+    deliver(broker)
+    order_pipeline._intents["old"]["updated"] = time.time() - order_pipeline.RETENTION - 1
+    submit(client_msg_id="fresh")
+    assert "old" not in order_pipeline._intents and "fresh" in order_pipeline._intents